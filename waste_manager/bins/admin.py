@@ -1,5 +1,36 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from .models import BinGroup, Node, SensorReading, AICost, CollectionRoute, Notification, UserSetting
+from .utils.db import estimated_row_count
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reports the planner's row estimate for unfiltered querysets on
+    large tables, instead of a full COUNT(*) on every changelist page.
+    """
+    # Below this the estimate is too coarse and an exact count is cheap anyway
+    min_estimate = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if hasattr(qs, 'query') and not qs.query.has_filters():
+            estimate = estimated_row_count(qs.model, using=qs.db)
+            if estimate is not None and estimate >= self.min_estimate:
+                return estimate
+        return super().count
+
+class ChangelistDeferMixin:
+    """Defer large columns that list_display never shows, on the changelist only."""
+    changelist_defer = ()
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        match = request.resolver_match
+        if self.changelist_defer and match and match.url_name.endswith('_changelist'):
+            qs = qs.defer(*self.changelist_defer)
+        return qs
 
 @admin.register(BinGroup)
 class BinGroupAdmin(admin.ModelAdmin):
@@ -9,26 +40,44 @@ class BinGroupAdmin(admin.ModelAdmin):
 class NodeAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'group', 'latitude', 'longitude', 'created_at')
     list_filter = ('group',)
+    list_select_related = ('group',)
 
 @admin.register(SensorReading)
 class SensorReadingAdmin(admin.ModelAdmin):
     list_display = ('id', 'node', 'temperature', 'humidity', 'gas_level', 'distance_to_next_bin', 'timestamp')
     list_filter = ('node',)
+    list_select_related = ('node',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # __str__ dereferences node.name, so join it on every admin path
+        return super().get_queryset(request).select_related('node')
 
 @admin.register(AICost)
-class AICostAdmin(admin.ModelAdmin):
+class AICostAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('id', 'node', 'predicted_cost', 'model_version', 'timestamp')
     list_filter = ('model_version',)
+    list_select_related = ('node',)
+    changelist_defer = ('features',)
+
+    def get_queryset(self, request):
+        # __str__ dereferences node.name, so join it on every admin path
+        return super().get_queryset(request).select_related('node')
 
 @admin.register(CollectionRoute)
-class CollectionRouteAdmin(admin.ModelAdmin):
+class CollectionRouteAdmin(ChangelistDeferMixin, admin.ModelAdmin):
     list_display = ('id', 'total_cost', 'generated_by', 'timestamp')
+    list_select_related = ('generated_by',)
+    changelist_defer = ('route_data',)
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'level', 'is_read', 'created_at')
     list_filter = ('level', 'is_read')
+    list_select_related = ('user',)
 
 @admin.register(UserSetting)
 class UserSettingAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'notify_email', 'polling_interval_sec', 'created_at')
\ No newline at end of file
+    list_display = ('id', 'user', 'notify_email', 'polling_interval_sec', 'created_at')
+    list_select_related = ('user',)
\ No newline at end of file
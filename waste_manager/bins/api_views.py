@@ -28,8 +28,9 @@ from .drf_serializers import (
 )
 from .models import (
     Node, SensorReading, Notification, UserSetting,
-    CollectionRoute,
+    CollectionRoute, latest_readings_for,
 )
+from .serializers import annotate_last_reading
 from .utils.ai.model_store import get_model_version
 from .utils.priority_calculator import priority_calculator
 
@@ -50,12 +51,9 @@ class DashboardAPIView(APIView):
 
     def get(self, request):
         # Latest reading per node
-        latest_per_node = {}
-        for r in SensorReading.objects.select_related('node').order_by('node_id', '-timestamp'):
-            if r.node_id not in latest_per_node:
-                latest_per_node[r.node_id] = r
-
-        readings = list(latest_per_node.values())
+        readings = list(latest_readings_for().select_related('node__group'))
+        for r in readings:
+            r.node.last_reading_ts = r.timestamp
         readings_data = SensorReadingSerializer(readings, many=True).data
 
         # Stats
@@ -93,12 +91,9 @@ class DashboardAPIView(APIView):
             try:
                 user_lat = float(user_lat)
                 user_lng = float(user_lng)
-                nodes = list(Node.objects.all())
-                top_nodes = priority_calculator.select_top_priority_nodes(
-                    nodes=nodes, user_lat=user_lat, user_lng=user_lng, max_nodes=5
-                )
-                priorities, traffic_scores = priority_calculator.calculate_node_priorities(
-                    nodes=nodes, user_lat=user_lat, user_lng=user_lng, use_ai_model=True
+                nodes = list(Node.objects.only(*Node.ROUTING_FIELDS))
+                priorities, traffic_scores, top_nodes = priority_calculator.calculate_with_top(
+                    nodes=nodes, user_lat=user_lat, user_lng=user_lng, max_nodes=5, use_ai_model=True
                 )
                 priority_info = {
                     'user_location': {'lat': user_lat, 'lng': user_lng},
@@ -233,7 +228,7 @@ class NodeListAPIView(generics.ListAPIView):
     serializer_class = NodeSerializer
 
     def get_queryset(self):
-        return Node.objects.all().order_by('id')
+        return annotate_last_reading(Node.objects.all()).order_by('id')
 
 
 class EnsureNodeAPIView(APIView):
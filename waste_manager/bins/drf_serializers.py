@@ -24,8 +24,12 @@ class NodeSerializer(serializers.ModelSerializer):
                   'last_update', 'created_at', 'last_reading_at']
 
     def get_last_reading_at(self, obj):
-        reading = obj.readings.order_by('-timestamp').first()
-        return reading.timestamp.isoformat() if reading else None
+        # Views annotate ``last_reading_ts`` up front to avoid a query per node
+        if hasattr(obj, 'last_reading_ts'):
+            ts = obj.last_reading_ts
+        else:
+            ts = obj.readings.order_by('-timestamp').values_list('timestamp', flat=True).first()
+        return ts.isoformat() if ts else None
 
 
 class SensorReadingSerializer(serializers.ModelSerializer):
@@ -0,0 +1,50 @@
+"""
+orjson-backed JSON encoding for API responses and JSONField writes.
+orjson is a C extension that emits UTF-8 bytes directly and is several times
+faster than the stdlib encoder on the reading/route payloads served here.
+Anything orjson cannot encode natively (Decimal, lazy strings, ...) falls back
+to DjangoJSONEncoder so output matches the previous behaviour.
+"""
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+# Routes/priorities are keyed by integer node ids; stdlib json stringifies
+# those keys, orjson needs OPT_NON_STR_KEYS to do the same.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_fallback_encoder = DjangoJSONEncoder()
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_fallback_encoder.default, option=ORJSON_OPTIONS)
+
+
+class OrjsonEncoder(DjangoJSONEncoder):
+    """JSONEncoder shim so model JSONFields serialize through orjson."""
+
+    def encode(self, o):
+        return dumps(o).decode('utf-8')
+
+
+class OrjsonResponse(HttpResponse):
+    """Drop-in replacement for JsonResponse (same ``safe`` semantics)."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                'In order to allow non-dict objects to be serialized set the '
+                'safe parameter to False.'
+            )
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class OrjsonRenderer(JSONRenderer):
+    """DRF renderer for the v1 API."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -71,14 +71,8 @@ class SettingsForm(forms.ModelForm):
         latitude = cleaned_data.get('latitude')
         longitude = cleaned_data.get('longitude')
         
-        # Validate coordinate ranges
-        if latitude is not None:
-            if not (-90 <= latitude <= 90):
-                raise forms.ValidationError("Latitude must be between -90 and 90 degrees")
-                
-        if longitude is not None:
-            if not (-180 <= longitude <= 180):
-                raise forms.ValidationError("Longitude must be between -180 and 180 degrees")
+        # Coordinate ranges are UserSetting check constraints, validated by
+        # the model's full_clean() in _post_clean and enforced by the DB.
         
         # Both coordinates should be provided together
         if (latitude is None) != (longitude is None):
@@ -89,6 +83,8 @@ class SettingsForm(forms.ModelForm):
 class LocationForm(forms.Form):
     """Standalone form for quick location updates on dashboard"""
     latitude = forms.FloatField(
+        min_value=-90,
+        max_value=90,
         widget=forms.NumberInput(attrs={
             'step': 'any',
             'placeholder': 'Latitude',
@@ -97,6 +93,8 @@ class LocationForm(forms.Form):
         })
     )
     longitude = forms.FloatField(
+        min_value=-180,
+        max_value=180,
         widget=forms.NumberInput(attrs={
             'step': 'any', 
             'placeholder': 'Longitude',
@@ -104,16 +102,3 @@ class LocationForm(forms.Form):
             'id': 'quick_longitude'
         })
     )
-    
-    def clean(self):
-        cleaned_data = super().clean()
-        latitude = cleaned_data.get('latitude')
-        longitude = cleaned_data.get('longitude')
-        
-        if latitude is not None and not (-90 <= latitude <= 90):
-            raise forms.ValidationError("Latitude must be between -90 and 90 degrees")
-            
-        if longitude is not None and not (-180 <= longitude <= 180):
-            raise forms.ValidationError("Longitude must be between -180 and 180 degrees")
-            
-        return cleaned_data
\ No newline at end of file
@@ -1,12 +1,37 @@
 from django.core.management.base import BaseCommand
 from django.db import connection
 from bins.models import BinGroup, Node, SensorReading, AICost
+from bins.utils.db import estimated_row_count_sql
 from bins.utils.ai.model_store import get_model_version
 import os
 
 class Command(BaseCommand):
     help = "Check system health and configuration"
 
+    def _model_counts(self):
+        """
+        All four table counts in one round trip. SensorReading grows without
+        bound, so use the planner's row estimate where the backend keeps one and
+        fall back to an exact COUNT(*) otherwise.
+        """
+        qn = connection.ops.quote_name
+        tables = [m._meta.db_table for m in (BinGroup, Node, SensorReading, AICost)]
+        exprs = [f'(SELECT COUNT(*) FROM {qn(t)})' for t in tables]
+        params = []
+        estimate = estimated_row_count_sql(SensorReading, connection.alias)
+        if estimate is not None:
+            exprs[2] = f'({estimate[0]})'
+            params = estimate[1]
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT ' + ', '.join(exprs), params)
+            bin_groups, nodes, readings, ai_costs = cursor.fetchone()
+
+        approx = bool(params)
+        if readings is None or readings < 0:   # table never analysed
+            readings, approx = SensorReading.objects.count(), False
+        return bin_groups, nodes, int(readings), ai_costs, approx
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('=== System Health Check ==='))
         
@@ -17,18 +42,28 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('✓ Database connection: OK'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'✗ Database connection: {e}'))
+
+        # Connection reuse
+        conn_max_age = connection.settings_dict.get('CONN_MAX_AGE', 0)
+        self.stdout.write(f'  - Persistent connections (CONN_MAX_AGE): {conn_max_age}s')
+        if connection.vendor == 'mysql':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN "
+                                   "('Threads_connected', 'Threads_running', 'Max_used_connections')")
+                    for name, value in cursor.fetchall():
+                        self.stdout.write(f'  - {name}: {value}')
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f'? Connection stats: {e}'))
         
         # Model counts
         try:
-            bin_groups = BinGroup.objects.count()
-            nodes = Node.objects.count()
-            readings = SensorReading.objects.count()
-            ai_costs = AICost.objects.count()
+            bin_groups, nodes, readings, ai_costs, approx = self._model_counts()
             
             self.stdout.write(self.style.SUCCESS(f'✓ Data counts:'))
             self.stdout.write(f'  - Bin Groups: {bin_groups}')
             self.stdout.write(f'  - Nodes: {nodes}')
-            self.stdout.write(f'  - Sensor Readings: {readings}')
+            self.stdout.write(f'  - Sensor Readings: {"~" if approx else ""}{readings}')
             self.stdout.write(f'  - AI Costs: {ai_costs}')
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'✗ Model access: {e}'))
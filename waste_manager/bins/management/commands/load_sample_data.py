@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
+from django.db import transaction
 from pathlib import Path
 from django.conf import settings
 
@@ -9,7 +10,9 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         base = settings.BASE_DIR / 'fixtures'
         files = ['sample_nodes.json', 'sample_readings.json', 'sample_ai_costs.json']
-        for f in files:
-            self.stdout.write(self.style.NOTICE(f'Loading {f}'))
-            call_command('loaddata', str(base / f))
+        self.stdout.write(self.style.NOTICE(f'Loading {", ".join(files)}'))
+        # One loaddata call = one transaction and one deserializer pass; the
+        # outer atomic keeps it all-or-nothing when called from other commands.
+        with transaction.atomic():
+            call_command('loaddata', *[str(base / f) for f in files])
         self.stdout.write(self.style.SUCCESS('Loaded sample fixtures.'))
\ No newline at end of file
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-15 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bins', '0006_sensorreading_traffic_density'),
+    ]
+
+    operations = [
+        # Add the covering index first so node_id stays indexed for the FK on MySQL
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['node', '-timestamp', 'waste_level', 'gas_level', 'temperature', 'humidity', 'traffic_density'], name='sr_latest_cov'),
+        ),
+        migrations.RemoveIndex(
+            model_name='sensorreading',
+            name='bins_sensor_node_id_b4aef3_idx',
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-15 09:35
+
+import bins.fastjson
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bins', '0007_sensorreading_covering_latest_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aicost',
+            name='features',
+            field=models.JSONField(encoder=bins.fastjson.OrjsonEncoder),
+        ),
+        migrations.AlterField(
+            model_name='collectionroute',
+            name='route_data',
+            field=models.JSONField(encoder=bins.fastjson.OrjsonEncoder),
+        ),
+    ]
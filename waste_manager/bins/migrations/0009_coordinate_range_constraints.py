@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-15 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bins', '0008_jsonfield_orjson_encoder'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='node',
+            constraint=models.CheckConstraint(check=models.Q(('latitude__isnull', True), models.Q(('latitude__gte', -90), ('latitude__lte', 90)), _connector='OR'), name='node_latitude_range', violation_error_message='Latitude must be between -90 and 90 degrees'),
+        ),
+        migrations.AddConstraint(
+            model_name='node',
+            constraint=models.CheckConstraint(check=models.Q(('longitude__isnull', True), models.Q(('longitude__gte', -180), ('longitude__lte', 180)), _connector='OR'), name='node_longitude_range', violation_error_message='Longitude must be between -180 and 180 degrees'),
+        ),
+        migrations.AddConstraint(
+            model_name='usersetting',
+            constraint=models.CheckConstraint(check=models.Q(('latitude__isnull', True), models.Q(('latitude__gte', -90), ('latitude__lte', 90)), _connector='OR'), name='usersetting_latitude_range', violation_error_message='Latitude must be between -90 and 90 degrees'),
+        ),
+        migrations.AddConstraint(
+            model_name='usersetting',
+            constraint=models.CheckConstraint(check=models.Q(('longitude__isnull', True), models.Q(('longitude__gte', -180), ('longitude__lte', 180)), _connector='OR'), name='usersetting_longitude_range', violation_error_message='Longitude must be between -180 and 180 degrees'),
+        ),
+    ]
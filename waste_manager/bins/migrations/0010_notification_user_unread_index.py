@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-15 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bins', '0009_coordinate_range_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='notif_user_unread'),
+        ),
+    ]
@@ -1,6 +1,26 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Case, F, Q, Value, When, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
+from django.utils.functional import cached_property
+from .fastjson import OrjsonEncoder
+from .utils.reading_cache import bump_readings_version
+
+def coordinate_constraints(prefix):
+    """DB-level range checks for nullable latitude/longitude columns."""
+    return [
+        models.CheckConstraint(
+            check=Q(latitude__isnull=True) | Q(latitude__gte=-90, latitude__lte=90),
+            name=f'{prefix}_latitude_range',
+            violation_error_message='Latitude must be between -90 and 90 degrees',
+        ),
+        models.CheckConstraint(
+            check=Q(longitude__isnull=True) | Q(longitude__gte=-180, longitude__lte=180),
+            name=f'{prefix}_longitude_range',
+            violation_error_message='Longitude must be between -180 and 180 degrees',
+        ),
+    ]
 
 class BinGroup(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -17,12 +37,22 @@ class Node(models.Model):
     last_update = models.DateTimeField(auto_now=True)  # Auto-update timestamp for dashboard
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Columns priority scoring and routing read (ids, coordinates, labels)
+    ROUTING_FIELDS = ('id', 'name', 'latitude', 'longitude')
+
+    class Meta:
+        constraints = coordinate_constraints('node')
+
     def __str__(self):
         return self.name
     
     def get_latest_reading(self):
         """Get the most recent sensor reading for this node"""
-        return self.readings.order_by('-timestamp').first()
+        # Restrict to the columns carried by the sr_latest_cov index
+        return (self.readings
+                .only(*SensorReading.LATEST_FIELDS)
+                .order_by('-timestamp')
+                .first())
 
 class SensorReading(models.Model):
     node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name='readings')
@@ -39,10 +69,20 @@ class SensorReading(models.Model):
     distance_to_next_bin = models.FloatField(null=True, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
 
+    # Columns read by "latest reading per node" lookups; kept in sync with sr_latest_cov
+    LATEST_FIELDS = ('node_id', 'timestamp', 'waste_level', 'gas_level',
+                     'temperature', 'humidity', 'traffic_density')
+
     class Meta:
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['node', '-timestamp']),
+            # Covering index: (node, -timestamp) drives the lookup and the trailing
+            # key columns let MySQL/InnoDB answer it from the index alone.
+            models.Index(
+                fields=['node', '-timestamp', 'waste_level', 'gas_level',
+                        'temperature', 'humidity', 'traffic_density'],
+                name='sr_latest_cov',
+            ),
         ]
 
     def __str__(self):
@@ -50,14 +90,87 @@ class SensorReading(models.Model):
     
     def save(self, *args, **kwargs):
         """Update node's last_update timestamp when a new reading is saved"""
-        super().save(*args, **kwargs)
-        # Update the node's last_update timestamp
-        self.node.last_update = self.timestamp
-        self.node.save(update_fields=['last_update'])
+        # INSERT + node UPDATE commit together: one transaction, one commit
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            # Single UPDATE on the node row, without loading or re-saving the Node;
+            # an older (backfilled) reading never moves last_update backwards
+            Node.objects.filter(
+                Q(last_update__lt=self.timestamp) | Q(last_update__isnull=True), pk=self.node_id,
+            ).update(last_update=self.timestamp)
+        if SensorReading.node.is_cached(self):
+            node = self.node
+            if node.last_update is None or node.last_update < self.timestamp:
+                node.last_update = self.timestamp
+        # Only invalidate once the reading is visible: bumping inside an outer
+        # transaction would let a concurrent request cache the pre-commit rows
+        # under the new version
+        transaction.on_commit(bump_readings_version, using=using)
+
+    @classmethod
+    def bulk_ingest(cls, readings, batch_size=500):
+        """
+        Insert many readings at once and bump each node's last_update with a
+        single batched UPDATE (bulk_create bypasses save()), all in one
+        transaction. As in save(), last_update only ever moves forward.
+        """
+        using = router.db_for_write(cls)
+        with transaction.atomic(using=using, savepoint=False):
+            created = cls.objects.using(using).bulk_create(readings, batch_size=batch_size)
+            latest_by_node = {}
+            for r in created:
+                ts = latest_by_node.get(r.node_id)
+                if ts is None or r.timestamp > ts:
+                    latest_by_node[r.node_id] = r.timestamp
+            if latest_by_node:
+                # One UPDATE ... SET last_update = CASE ... for all touched nodes
+                Node.objects.using(using).filter(pk__in=latest_by_node).update(last_update=Case(
+                    *[When(Q(pk=nid) & (Q(last_update__lt=ts) | Q(last_update__isnull=True)),
+                           then=Value(ts, output_field=models.DateTimeField()))
+                      for nid, ts in latest_by_node.items()],
+                    default=F('last_update'),
+                ))
+        if latest_by_node:
+            transaction.on_commit(bump_readings_version, using=using)
+        return created
+
+def _ranked_readings(nodes=None):
+    """SensorReadings annotated with row_number = recency rank within their node."""
+    qs = SensorReading.objects.all()
+    if nodes is not None:
+        if isinstance(nodes, models.QuerySet):
+            qs = qs.filter(node__in=nodes)
+        else:
+            qs = qs.filter(node_id__in=[getattr(n, 'pk', n) for n in nodes])
+    return qs.annotate(row_number=Window(
+        expression=RowNumber(),
+        partition_by=[F('node_id')],
+        order_by=F('timestamp').desc(),
+    ))
+
+def latest_readings_for(nodes=None):
+    """
+    Latest SensorReading per node in a single query, via
+    ROW_NUMBER() OVER (PARTITION BY node_id ORDER BY timestamp DESC).
+
+    `nodes` may be a Node queryset, an iterable of Node objects/ids, or None
+    for every node. Returns a queryset ordered by node_id.
+    """
+    return _ranked_readings(nodes).filter(row_number=1).order_by('node_id')
+
+def recent_readings_for(nodes=None, per_node=10):
+    """
+    The last `per_node` SensorReadings of each node in a single query (same
+    window as latest_readings_for). Ordered by node_id, newest first.
+    """
+    return (_ranked_readings(nodes)
+            .filter(row_number__lte=per_node)
+            .order_by('node_id', '-timestamp'))
 
 class AICost(models.Model):
     node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name='ai_costs')
-    features = models.JSONField()
+    features = models.JSONField(encoder=OrjsonEncoder)
     predicted_cost = models.FloatField()
     timestamp = models.DateTimeField(auto_now_add=True)
     model_version = models.CharField(max_length=50, blank=True, default='')
@@ -66,7 +179,7 @@ class AICost(models.Model):
         return f"{self.node.name} cost={self.predicted_cost:.3f} ({self.model_version})"
 
 class CollectionRoute(models.Model):
-    route_data = models.JSONField()  # e.g., {"path": [id1, id2, ...], "edges": [{"u": id1, "v": id2, "w": 123.4}, ...]}
+    route_data = models.JSONField(encoder=OrjsonEncoder)  # e.g., {"path": [id1, id2, ...], "edges": [{"u": id1, "v": id2, "w": 123.4}, ...]}
     total_cost = models.FloatField()
     generated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -83,6 +196,12 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Unread-count badge (user, is_read=False) is answered from the index alone
+            models.Index(fields=['user', 'is_read'], name='notif_user_unread'),
+        ]
+
 class UserSetting(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='settings')
     notify_email = models.BooleanField(default=False)
@@ -113,6 +232,9 @@ class UserSetting(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = coordinate_constraints('usersetting')
+
     def __str__(self):
         location_info = ""
         if self.latitude and self.longitude:
@@ -123,12 +245,25 @@ class UserSetting(models.Model):
         """Check if user has valid location coordinates"""
         return self.latitude is not None and self.longitude is not None
     
-    def get_location_dict(self):
-        """Get location as dictionary for API usage"""
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.__dict__.pop('location_dict', None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.__dict__.pop('location_dict', None)
+
+    @cached_property
+    def location_dict(self):
+        """Location as a dict, built once per loaded/saved instance (FloatFields are already floats)"""
         if self.has_location():
             return {
-                'lat': float(self.latitude),
-                'lng': float(self.longitude),
+                'lat': self.latitude,
+                'lng': self.longitude,
                 'name': self.location_name
             }
-        return None
\ No newline at end of file
+        return None
+    
+    def get_location_dict(self):
+        """Get location as dictionary for API usage"""
+        return self.location_dict
\ No newline at end of file
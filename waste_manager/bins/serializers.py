@@ -1,14 +1,35 @@
+from django.db.models import Max
+from .models import SensorReading
+
+
+def annotate_last_reading(nodes_qs):
+    """Attach ``group`` and ``last_reading_ts`` to a Node queryset in a single query."""
+    return nodes_qs.select_related('group').annotate(last_reading_ts=Max('readings__timestamp'))
+
+
+def _last_reading_ts(node):
+    if hasattr(node, 'last_reading_ts'):
+        return node.last_reading_ts
+    # Unannotated node: fall back to one lookup for this node only
+    return node.readings.order_by('-timestamp').values_list('timestamp', flat=True).first()
+
+
 def serialize_node(node):
+    last_ts = _last_reading_ts(node)
     return {
         'id': node.id,
         'name': node.name,
         'lat': node.latitude,
         'lng': node.longitude,
-        'group': node.group.name if node.group else None,
-        'last_update': (node.readings.order_by('-timestamp').first().timestamp.isoformat()
-                        if node.readings.exists() else None),
+        'group': node.group.name if node.group_id else None,
+        'last_update': last_ts.isoformat() if last_ts else None,
     }
 
+
+def serialize_nodes(nodes_qs):
+    return [serialize_node(n) for n in annotate_last_reading(nodes_qs)]
+
+
 def serialize_reading(r):
     return {
         'node': serialize_node(r.node),
@@ -18,4 +39,55 @@ def serialize_reading(r):
         'waste_level': r.waste_level,
         'distance_to_next_bin': r.distance_to_next_bin,
         'timestamp': r.timestamp.isoformat(),
-    }
\ No newline at end of file
+    }
+
+
+READING_VALUE_FIELDS = (
+    'node_id', 'node__name', 'node__latitude', 'node__longitude', 'node__group__name',
+    'temperature', 'humidity', 'gas_level', 'waste_level', 'distance_to_next_bin', 'timestamp',
+)
+
+
+def last_reading_ts_by_node(node_ids=None):
+    """{node_id: latest reading timestamp} from one GROUP BY (all nodes when node_ids is None)."""
+    qs = SensorReading.objects.all()
+    if node_ids is not None:
+        qs = qs.filter(node_id__in=node_ids)
+    return dict(
+        qs.order_by()
+        .values('node_id')
+        .annotate(ts=Max('timestamp'))
+        .values_list('node_id', 'ts')
+    )
+
+
+def serialize_reading_row(row, last_ts):
+    """Serialize one ``values(*READING_VALUE_FIELDS)`` row; `last_ts` maps node_id -> timestamp."""
+    node_ts = last_ts.get(row['node_id'])
+    return {
+        'node': {
+            'id': row['node_id'],
+            'name': row['node__name'],
+            'lat': row['node__latitude'],
+            'lng': row['node__longitude'],
+            'group': row['node__group__name'],
+            'last_update': node_ts.isoformat() if node_ts else None,
+        },
+        'temperature': row['temperature'],
+        'humidity': row['humidity'],
+        'gas_level': row['gas_level'],
+        'waste_level': row['waste_level'],
+        'distance_to_next_bin': row['distance_to_next_bin'],
+        'timestamp': row['timestamp'].isoformat(),
+    }
+
+
+def serialize_reading_rows(rows):
+    """
+    Serialize ``SensorReading.objects.values(*READING_VALUE_FIELDS)`` rows into
+    the same shape as serialize_reading, resolving every node's last reading
+    time in one query and without materializing model instances.
+    """
+    rows = list(rows)
+    last_ts = last_reading_ts_by_node({row['node_id'] for row in rows})
+    return [serialize_reading_row(row, last_ts) for row in rows]
\ No newline at end of file
@@ -47,6 +47,91 @@ class RoutingRefinementTests(SimpleTestCase):
         self.assertGreater(aged[0], prio[0])
         self.assertAlmostEqual(aged[1], prio[1])
 
+    def test_priority_graph_matches_scalar_edge_weights(self):
+        from django.test import override_settings
+        from bins.utils.dijkstra import build_priority_graph, calculate_edge_weight, haversine_distance
+        prio = {i: i / 10.0 for i in range(len(self.nodes))}
+        traffic = {1: 0.5, 4: 1.0}
+        with override_settings(ROUTING_EQUIRECT_DISTANCE=False):
+            graph = build_priority_graph(self.nodes, prio, traffic)
+        for u in self.nodes:
+            self.assertEqual([v for v, _ in graph[u.id]], [n.id for n in self.nodes if n is not u])
+            for v, w in graph[u.id]:
+                base = haversine_distance(*self.cmap[u.id], *self.cmap[v])
+                expected = calculate_edge_weight(base, prio[v], {'traffic_density': traffic.get(v, 0.0)})
+                # weights are float32: compare to its ~1e-7 relative precision
+                self.assertAlmostEqual(w, expected, delta=1e-6 * expected)
+
+    def test_equirect_distances_stay_close_to_haversine(self):
+        from bins.utils.geo import (distance_to_point_m, haversine_to_point_m,
+                                    pairwise_distance_m, pairwise_haversine_m)
+        lats = [la for la, _ in self.coords]
+        lngs = [lo for _, lo in self.coords]
+        fast, exact = pairwise_distance_m(lats, lngs), pairwise_haversine_m(lats, lngs)
+        self.assertLess(abs(fast - exact).max(), 0.005 * exact.max())
+        fast = distance_to_point_m(*self.depot, lats, lngs)
+        exact = haversine_to_point_m(*self.depot, lats, lngs)
+        self.assertLess(abs(fast - exact).max(), 0.005 * exact.max())
+        # Far-apart points fall back to the exact formula
+        self.assertEqual(pairwise_distance_m([23.8, 22.3], [90.4, 91.8]).tolist(),
+                         pairwise_haversine_m([23.8, 22.3], [90.4, 91.8]).tolist())
+
+    def test_k_nearest_priority_graph_keeps_nearest_edges(self):
+        from django.test import override_settings
+        from bins.utils.dijkstra import build_priority_graph, haversine_distance
+        prio = {n.id: 0.1 * (n.id % 5) for n in self.nodes}
+        base = lambda u, v: haversine_distance(*self.cmap[u], *self.cmap[v])
+        # Sparse edges weigh the same as dense ones under either distance metric
+        for equirect in (False, True):
+            with override_settings(ROUTING_EQUIRECT_DISTANCE=equirect):
+                full = build_priority_graph(self.nodes, prio)
+                self.assertEqual(build_priority_graph(self.nodes, prio, k_neighbors=len(self.nodes)), full)
+                sparse = build_priority_graph(self.nodes, prio, k_neighbors=3)
+            for u in self.nodes:
+                self.assertEqual(len(sparse[u.id]), 3)
+                full_w = dict(full[u.id])
+                nearest = sorted(full_w, key=lambda v: base(u.id, v))[:3]
+                self.assertEqual([v for v, _ in sparse[u.id]], nearest)
+                for v, w in sparse[u.id]:
+                    self.assertAlmostEqual(w, full_w[v], delta=1e-6 * w)
+
+    def test_optimal_route_exposes_weight_matrix(self):
+        from bins.utils.dijkstra import build_priority_graph, compute_optimal_route
+        prio = {n.id: 0.1 * (n.id % 5) for n in self.nodes}
+        res = compute_optimal_route(self.nodes, prio, user_location={'lat': 23.80, 'lng': 90.36})
+        self.assertNotIn('graph_edges', res)
+        self.assertEqual(res['node_ids'], [n.id for n in self.nodes])
+        graph = build_priority_graph(self.nodes, prio)
+        for u, row in zip(res['node_ids'], res['weight_matrix']):
+            for v, w in graph[u]:
+                self.assertAlmostEqual(row[res['node_ids'].index(v)], w, places=6)
+
+    def test_node_distance_matrix_is_cached_per_node_positions(self):
+        from bins.utils.geo import node_distance_matrix
+        first = node_distance_matrix(self.nodes)
+        self.assertIs(node_distance_matrix(self.nodes), first)
+        self.assertFalse(first.flags.writeable)
+        moved = [_FakeNode(n.id, n.latitude + 0.01, n.longitude) for n in self.nodes]
+        self.assertIsNot(node_distance_matrix(moved), first)
+
+    def test_node_distance_matrix_cache_is_bounded_by_bytes(self):
+        from unittest import mock
+        from bins.utils import geo
+        one = geo.node_distance_matrix(self.nodes).nbytes
+        with mock.patch.object(geo, 'DISTANCE_MATRIX_CACHE_BYTES', one), \
+                mock.patch.object(geo, '_matrix_cache', type(geo._matrix_cache)()), \
+                mock.patch.object(geo, '_matrix_cache_bytes', 0):
+            first = geo.node_distance_matrix(self.nodes)
+            moved = [_FakeNode(n.id, n.latitude + 0.01, n.longitude) for n in self.nodes]
+            geo.node_distance_matrix(moved)
+            # Only one matrix fits, so the first was evicted
+            self.assertEqual(len(geo._matrix_cache), 1)
+            self.assertIsNot(geo.node_distance_matrix(self.nodes), first)
+            # A matrix over the whole budget is returned but not kept
+            more = self.nodes + [_FakeNode(99, 23.9, 90.4)]
+            geo.node_distance_matrix(more)
+            self.assertEqual(geo._matrix_cache_bytes, one)
+
 
 class ForwardModelIntegrationTests(TestCase):
     """End-to-end: seed telemetry -> train forward model -> risk-aware priority."""
@@ -76,7 +161,7 @@ class ForwardModelIntegrationTests(TestCase):
 
     def test_train_forward_and_predict(self):
         from bins.models import Node
-        from bins.utils.ai.train_forward import train_forward, predict_forward
+        from bins.utils.ai.train_forward import train_forward, predict_forward, predict_forward_batch
         from bins.utils.ai.model_store import load_forward_bundle
         from bins.utils.priority_calculator import priority_calculator
 
@@ -91,6 +176,7 @@ class ForwardModelIntegrationTests(TestCase):
         row = {c: 0.0 for c in bundle["features"]}
         row.update(waste=0.95, mean_waste=0.9, gas=0.8, mean_gas=0.75, temp=32, humidity=80)
         pred = predict_forward(bundle, row)
+        self.assertEqual(predict_forward_batch(bundle, [row, {}])[0], pred)
         self.assertGreaterEqual(pred["risk_priority"], 0.0)
         self.assertLessEqual(pred["risk_priority"], 1.0)
 
@@ -102,6 +188,10 @@ class ForwardModelIntegrationTests(TestCase):
         for v in priorities.values():
             self.assertGreaterEqual(v, 0.0)
             self.assertLessEqual(v, 1.0)
+        # batched scoring agrees with scoring each node on its own
+        for node in nodes:
+            self.assertAlmostEqual(
+                priorities[node.id], priority_calculator._predict_priority_forward(bundle, node))
 
 class DijkstraTests(TestCase):
     def test_small_graph(self):
@@ -114,6 +204,20 @@ class DijkstraTests(TestCase):
         self.assertEqual(res['path'], [1, 2, 3])
         self.assertAlmostEqual(res['total_cost'], 3.0, places=5)
 
+    def test_negative_weights_and_distance_tree_match_dijkstra(self):
+        import warnings
+        from bins.utils.dijkstra import dijkstra
+        graph = {1: [(2, 1.0), (3, 4.0)], 2: [(3, -0.5), (4, 1.0)], 3: []}
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            res = compute_route(graph, source=1, targets=[3])
+        self.assertEqual(res['path'], [1, 2, 3])
+        self.assertAlmostEqual(res['total_cost'], 0.5)
+        dist, prev = dijkstra(graph, 1)
+        tree = compute_route(graph, source=1)
+        self.assertEqual((tree['distances'], tree['tree_prev']), (dist, prev))
+        self.assertEqual(set(tree['distances']), {1, 2, 3, 4})
+
     def test_inverse_priority_weight(self):
         # Two nodes at same location delta; higher priority should have lower incoming edge weight
         n1 = Node.objects.create(name='A', latitude=23.78, longitude=90.28)
@@ -129,4 +233,495 @@ class DijkstraTests(TestCase):
         g2 = _build_graph(nodes, priorities_swapped, alpha)
         w_ab_swapped = next(w for v, w in g2[n1.id] if v == n2.id)
         # When B has higher priority (0.9), A->B should be cheaper than when B has lower (0.2)
-        self.assertLess(w_ab, w_ab_swapped)
\ No newline at end of file
+        self.assertLess(w_ab, w_ab_swapped)
+
+class SerializerTests(TestCase):
+    def test_serialize_reading_rows_resolves_last_update_in_one_query(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from bins.models import SensorReading
+        from bins.serializers import serialize_reading_rows, READING_VALUE_FIELDS
+        now = timezone.now()
+        for i in range(3):
+            node = Node.objects.create(name=f'S{i}', latitude=23.8, longitude=90.36)
+            for h in range(2):
+                SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                             gas_level=0.1, waste_level=0.5,
+                                             timestamp=now - timedelta(hours=h))
+        rows = list(SensorReading.objects.values(*READING_VALUE_FIELDS))
+        with self.assertNumQueries(1):
+            data = serialize_reading_rows(rows)
+        self.assertEqual(len(data), 6)
+        self.assertEqual({d['node']['last_update'] for d in data}, {now.isoformat()})
+
+
+class SensorReadingIngestTests(TestCase):
+    def test_save_and_bulk_ingest_bump_node_last_update(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from bins.models import SensorReading
+        node = Node.objects.create(name='Ingest', latitude=23.8, longitude=90.36)
+        ts = timezone.now() - timedelta(days=2)
+        Node.objects.filter(pk=node.pk).update(last_update=ts - timedelta(days=1))
+        SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                     gas_level=0.1, waste_level=0.5, timestamp=ts)
+        node.refresh_from_db()
+        self.assertEqual(node.last_update, ts)
+
+        batch = [SensorReading(node=node, temperature=25, humidity=60, gas_level=0.1,
+                               waste_level=0.5, timestamp=ts + timedelta(hours=h))
+                 for h in range(1, 4)]
+        with self.assertNumQueries(2):
+            SensorReading.bulk_ingest(batch)
+        node.refresh_from_db()
+        self.assertEqual(node.last_update, ts + timedelta(hours=3))
+        self.assertEqual(node.readings.count(), 4)
+
+        # Backfilled (older) readings never move last_update backwards
+        other = Node.objects.create(name='Other')
+        SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                     gas_level=0.1, waste_level=0.5, timestamp=ts)
+        SensorReading.bulk_ingest([
+            SensorReading(node=node, temperature=25, humidity=60, gas_level=0.1,
+                          waste_level=0.5, timestamp=ts - timedelta(hours=1)),
+            SensorReading(node=other, temperature=25, humidity=60, gas_level=0.1,
+                          waste_level=0.5, timestamp=timezone.now() + timedelta(hours=1)),
+        ])
+        node.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(node.last_update, ts + timedelta(hours=3))
+        self.assertGreater(other.last_update, timezone.now())
+
+
+class LatestReadingsTests(TestCase):
+    def test_latest_readings_for_returns_one_row_per_node(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from bins.models import SensorReading, latest_readings_for
+        now = timezone.now()
+        nodes = [Node.objects.create(name=f'L{i}') for i in range(3)]
+        for node in nodes:
+            for h in range(3):
+                SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                             gas_level=0.1, waste_level=0.1 * h,
+                                             timestamp=now - timedelta(hours=h))
+        with self.assertNumQueries(1):
+            latest = list(latest_readings_for(nodes[:2]))
+        self.assertEqual([r.node_id for r in latest], [nodes[0].id, nodes[1].id])
+        self.assertTrue(all(r.timestamp == now for r in latest))
+        self.assertEqual(latest_readings_for().count(), 3)
+
+    def test_recent_readings_for_caps_rows_per_node(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from bins.models import SensorReading, recent_readings_for
+        now = timezone.now()
+        nodes = [Node.objects.create(name=f'R{i}') for i in range(2)]
+        for node in nodes:
+            for h in range(4):
+                SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                             gas_level=0.1, waste_level=0.1 * h,
+                                             timestamp=now - timedelta(hours=h))
+        with self.assertNumQueries(1):
+            recent = list(recent_readings_for(nodes, per_node=2))
+        self.assertEqual([(r.node_id, r.timestamp) for r in recent],
+                         [(n.id, now - timedelta(hours=h)) for n in nodes for h in range(2)])
+
+
+
+class ModelStoreCacheTests(SimpleTestCase):
+    def test_model_and_meta_are_cached_until_rewritten(self):
+        import tempfile
+        from pathlib import Path
+        from django.test import override_settings
+        from bins.utils.ai import model_store
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(MODEL_FILENAME=Path(tmp) / 'm.joblib',
+                                   MODEL_META_FILENAME=Path(tmp) / 'm.json'):
+                self.assertIsNone(model_store.load_model())
+                self.assertEqual(model_store.get_model_version(), 'unknown')
+                model_store.save_model({'w': 1}, {'version': 'v1'})
+                first = model_store.load_model()
+                self.assertIs(model_store.load_model(), first)
+                self.assertEqual(model_store.get_model_version(), 'v1')
+                model_store.save_model({'w': 2}, {'version': 'v2'})
+                self.assertEqual(model_store.load_model(), {'w': 2})
+                self.assertEqual(model_store.get_model_version(), 'v2')
+            with override_settings(FORWARD_MODEL_FILENAME=Path(tmp) / 'f.joblib',
+                                   FORWARD_MODEL_META_FILENAME=Path(tmp) / 'f.json'):
+                self.assertIsNone(model_store.load_forward_bundle())
+                model_store.save_forward_bundle({'features': ['a']}, {'v': 1})
+                bundle = model_store.load_forward_bundle()
+                self.assertIs(model_store.load_forward_bundle(), bundle)
+                model_store.save_forward_bundle({'features': ['b']}, {'v': 2})
+                self.assertEqual(model_store.load_forward_bundle(), {'features': ['b']})
+                self.assertEqual(model_store.load_forward_meta(), {'v': 2})
+
+
+class TrainIfStaleTests(TestCase):
+    def test_retrain_only_when_readings_change(self):
+        import tempfile
+        from pathlib import Path
+        from django.test import override_settings
+        from django.utils import timezone
+        from bins.models import Node, SensorReading
+        from bins.utils.ai.train_model import train_from_db
+        for i in range(6):
+            node = Node.objects.create(name=f'T{i}', latitude=23.78 + i * 0.001, longitude=90.28)
+            SensorReading.objects.create(node=node, temperature=25 + i, humidity=60, gas_level=0.1 * i,
+                                         waste_level=0.15 * i, timestamp=timezone.now())
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(MODEL_FILENAME=Path(tmp) / 'm.joblib',
+                                   MODEL_META_FILENAME=Path(tmp) / 'm.json'):
+                first = train_from_db(n_estimators=5)
+                self.assertTrue(first['retrained'])
+                again = train_from_db(n_estimators=5)
+                self.assertFalse(again['retrained'])
+                self.assertEqual(again['meta']['version'], first['meta']['version'])
+                self.assertEqual(again['feature_importances'], first['feature_importances'])
+                SensorReading.objects.create(node=node, temperature=30, humidity=70, gas_level=0.9,
+                                             waste_level=0.9, timestamp=timezone.now())
+                self.assertTrue(train_from_db(n_estimators=5)['retrained'])
+                self.assertFalse(train_from_db(n_estimators=5)['retrained'])
+                # Deleting an older reading leaves max(id) alone but still retrains
+                SensorReading.objects.filter(node__name='T0').delete()
+                self.assertTrue(train_from_db(n_estimators=5)['retrained'])
+                SensorReading.objects.filter(node__name='T1').update(timestamp=timezone.now())
+                self.assertTrue(train_from_db(n_estimators=5)['retrained'])
+                # Features include node coordinates, so moving a node retrains
+                Node.objects.filter(name='T2').update(latitude=23.9)
+                self.assertTrue(train_from_db(n_estimators=5)['retrained'])
+                self.assertFalse(train_from_db(n_estimators=5)['retrained'])
+                self.assertTrue(train_from_db(n_estimators=5, force=True)['retrained'])
+
+
+class PredictCostTests(TestCase):
+    def test_predict_cost_writes_one_row_per_node_in_bulk(self):
+        import json
+        import tempfile
+        from pathlib import Path
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from django.utils import timezone
+        from bins.models import AICost, SensorReading
+        from bins.utils.ai.train_model import train_from_db
+        for i in range(6):
+            node = Node.objects.create(name=f'P{i}', latitude=23.78 + i * 0.001, longitude=90.28)
+            SensorReading.objects.create(node=node, temperature=25 + i, humidity=60, gas_level=0.1 * i,
+                                         waste_level=0.15 * i, timestamp=timezone.now())
+        self.client.force_login(User.objects.create_user('p'))
+        with tempfile.TemporaryDirectory() as tmp:
+            with override_settings(MODEL_FILENAME=Path(tmp) / 'm.joblib',
+                                   MODEL_META_FILENAME=Path(tmp) / 'm.json'):
+                train_from_db(n_estimators=5)
+                resp = self.client.post('/api/predict-cost/', '{}', content_type='application/json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        preds = json.loads(resp.content)['predictions']
+        self.assertEqual(len(preds), 6)
+        self.assertEqual(AICost.objects.count(), 6)
+        self.assertEqual(set(AICost.objects.values_list('node_id', flat=True)),
+                         {p['node_id'] for p in preds})
+
+class NodeArraysTests(TestCase):
+    def test_node_arrays_from_queryset_and_objects_agree(self):
+        from bins.utils.geo import node_arrays
+        Node.objects.create(name='A', latitude=23.8, longitude=90.36)
+        Node.objects.create(name='B')
+        qs = Node.objects.order_by('id')
+        with self.assertNumQueries(1):
+            from_qs = node_arrays(qs)
+        from_objs = node_arrays(list(qs))
+        for a, b in zip(from_qs, from_objs):
+            self.assertEqual(a.tolist(), b.tolist())
+        self.assertEqual(from_qs.lats.tolist(), [23.8, 0.0])
+        self.assertIs(node_arrays(from_qs), from_qs)
+
+class CoordinateConstraintTests(TestCase):
+    def test_out_of_range_coordinates_are_rejected(self):
+        from django.contrib.auth.models import User
+        from django.db import IntegrityError, transaction
+        from bins.forms import SettingsForm
+        from bins.models import UserSetting
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Node.objects.create(name='Bad', latitude=123.0, longitude=90.0)
+
+        settings_obj = UserSetting.objects.create(user=User.objects.create_user('geo'))
+        form = SettingsForm({'polling_interval_sec': 10, 'latitude': 95, 'longitude': 90},
+                            instance=settings_obj)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Latitude must be between -90 and 90 degrees', form.non_field_errors())
+
+
+class LatestReadingsSnapshotTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        # Test rollbacks never run on_commit, so the version is not bumped between tests
+        cache.clear()
+
+    def test_snapshot_is_reused_until_a_reading_is_saved(self):
+        from bins.models import SensorReading
+        from bins.utils.priority_calculator import priority_calculator
+        node = Node.objects.create(name='Snap', latitude=23.8, longitude=90.36)
+        SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                     gas_level=0.1, waste_level=0.2)
+        first = priority_calculator._get_latest_readings([node])
+        with self.assertNumQueries(0):
+            self.assertEqual(priority_calculator._get_latest_readings([node]), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                         gas_level=0.1, waste_level=0.9)
+            # Not invalidated until the write commits
+            with self.assertNumQueries(0):
+                self.assertEqual(priority_calculator._get_latest_readings([node]), first)
+        self.assertEqual(priority_calculator._get_latest_readings([node])[node.id].waste_level, 0.9)
+
+    def test_priorities_are_shared_until_a_reading_is_saved(self):
+        from unittest import mock
+        from bins.models import SensorReading
+        from bins.utils.priority_calculator import priority_calculator
+        node = Node.objects.create(name='Prio', latitude=23.8, longitude=90.36)
+        SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                     gas_level=0.1, waste_level=0.2)
+        with mock.patch.object(priority_calculator, 'calculate_node_priorities',
+                               wraps=priority_calculator.calculate_node_priorities) as calc:
+            first = priority_calculator.cached_node_priorities([node], 23.80001, 90.36, use_ai_model=False)
+            again = priority_calculator.cached_node_priorities([node], 23.80004, 90.36, use_ai_model=False)
+            self.assertEqual(again, first)
+            self.assertEqual(calc.call_count, 1)
+            # The miss was computed at the exact location, not the rounded one
+            self.assertEqual(calc.call_args.args[1:3], (23.80001, 90.36))
+            with self.captureOnCommitCallbacks(execute=True):
+                SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                             gas_level=0.1, waste_level=0.9)
+            fresh, _ = priority_calculator.cached_node_priorities([node], 23.8, 90.36, use_ai_model=False)
+            self.assertEqual(calc.call_count, 2)
+        self.assertGreater(fresh[node.id], first[0][node.id])
+
+    def test_retrained_model_misses_cached_priorities(self):
+        import tempfile
+        from pathlib import Path
+        from unittest import mock
+        from django.test import override_settings
+        from bins.models import SensorReading
+        from bins.utils.ai import model_store
+        from bins.utils.priority_calculator import priority_calculator
+        node = Node.objects.create(name='Retrain', latitude=23.8, longitude=90.36)
+        SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                     gas_level=0.1, waste_level=0.2)
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(MODEL_FILENAME=Path(tmp) / 'm.joblib',
+                                  MODEL_META_FILENAME=Path(tmp) / 'm.json',
+                                  FORWARD_MODEL_FILENAME=Path(tmp) / 'f.joblib'), \
+                mock.patch.object(priority_calculator, 'calculate_node_priorities',
+                                  return_value=({}, {})) as calc:
+            priority_calculator.cached_node_priorities([node], 23.8, 90.36)
+            priority_calculator.cached_node_priorities([node], 23.8, 90.36)
+            self.assertEqual(calc.call_count, 1)
+            model_store.save_model({'w': 1}, {'version': 'v1'})
+            priority_calculator.cached_node_priorities([node], 23.8, 90.36)
+            self.assertEqual(calc.call_count, 2)
+
+    def test_pruned_nodes_are_capped_below_modelled_nodes(self):
+        from unittest import mock
+        import numpy as np
+        from bins.models import SensorReading
+        from bins.utils.priority_calculator import priority_calculator
+        # Two near bins (modelled, low scores) and three far, nearly full ones
+        coords = [(23.800, 90.36), (23.801, 90.36), (23.9, 90.5), (23.91, 90.5), (23.92, 90.5)]
+        nodes = [Node.objects.create(name=f'C{i}', latitude=la, longitude=lo)
+                 for i, (la, lo) in enumerate(coords)]
+        for node in nodes:
+            SensorReading.objects.create(node=node, temperature=35, humidity=90,
+                                         gas_level=0.9, waste_level=0.95)
+        model = mock.Mock()
+        model.predict.side_effect = lambda X: np.full(len(X), 0.1)
+        with mock.patch('bins.utils.priority_calculator.load_forward_bundle', return_value=None), \
+                mock.patch('bins.utils.priority_calculator.load_model', return_value=model):
+            pruned, _ = priority_calculator.calculate_node_priorities(
+                nodes, 23.8, 90.36, max_candidates=2)
+            full, _ = priority_calculator.calculate_node_priorities(nodes, 23.8, 90.36)
+        self.assertEqual(model.predict.call_args_list[0].args[0].shape[0], 2)
+        modelled = [pruned[n.id] for n in nodes[:2]]
+        self.assertEqual(modelled, [0.1, 0.1])
+        for node in nodes[2:]:
+            self.assertLess(pruned[node.id], min(modelled))
+        top = priority_calculator.select_top_priority_nodes(nodes, 23.8, 90.36, max_nodes=2,
+                                                            priorities=pruned)
+        self.assertEqual([n for n, _ in top], nodes[:2])
+        self.assertEqual(full, {n.id: 0.1 for n in nodes})
+
+    def test_calculate_with_top_scores_once(self):
+        from unittest import mock
+        from bins.models import SensorReading
+        from bins.utils.priority_calculator import priority_calculator
+        nodes = [Node.objects.create(name=f'T{i}', latitude=23.8, longitude=90.36) for i in range(4)]
+        for i, node in enumerate(nodes):
+            SensorReading.objects.create(node=node, temperature=25, humidity=60,
+                                         gas_level=0.1, waste_level=0.2 * i)
+        with mock.patch.object(priority_calculator, 'calculate_node_priorities',
+                               wraps=priority_calculator.calculate_node_priorities) as calc:
+            priorities, traffic, top = priority_calculator.calculate_with_top(
+                nodes, 23.8, 90.36, max_nodes=2, use_ai_model=False)
+            self.assertEqual(calc.call_count, 1)
+        self.assertEqual(set(priorities), {n.id for n in nodes})
+        self.assertEqual(set(traffic), {n.id for n in nodes})
+        self.assertEqual([n for n, _ in top], [nodes[3], nodes[2]])
+        self.assertEqual([p for _, p in top], [priorities[nodes[3].id], priorities[nodes[2].id]])
+
+
+class BatchedAIPriorityTests(SimpleTestCase):
+    def test_batched_predict_matches_per_row_predict(self):
+        from types import SimpleNamespace
+        import numpy as np
+        from django.utils import timezone
+        from sklearn.ensemble import RandomForestRegressor
+        from bins.utils.priority_calculator import priority_calculator as pc
+        rng = np.random.default_rng(0)
+        model = RandomForestRegressor(n_estimators=5, random_state=0).fit(
+            rng.random((50, 18)), rng.random(50) * 1.4 - 0.2)
+        rows = [(SimpleNamespace(temperature=20 + i, humidity=60, gas_level=0.1 * i,
+                                 waste_level=0.2 * i, traffic_density=0.3,
+                                 timestamp=timezone.now()), 100.0 * i)
+                for i in range(5)]
+        expected = [max(0.0, min(1.0, float(model.predict([pc._ai_features(r, d)])[0])))
+                    for r, d in rows]
+        got = pc._predict_priorities_with_ai(model, rows)
+        for g, e in zip(got, expected):
+            self.assertAlmostEqual(g, e, places=6)
+        # A model that cannot score the rows falls back to the rule for each
+        self.assertEqual(pc._predict_priorities_with_ai(object(), rows), pc._rule_priorities(rows))
+
+    def test_vectorized_rule_matches_single_priority(self):
+        from bins.utils.priority_calculator import priority_calculator as pc
+        rows = [
+            dict(distance_m=150.0, waste_level=0.9, gas_level=0.4, temperature=31.0,
+                 humidity=80.0, traffic_density=0.2),
+            dict(distance_m=5000.0, waste_level=-0.1, gas_level=1.3, temperature=5.0,
+                 humidity=40.0, traffic_density=None),
+            dict(distance_m=800.0, waste_level=None, gas_level=None, temperature=None,
+                 humidity=None, traffic_density=None),
+            dict(distance_m=None, waste_level=None, gas_level=None, temperature=None,
+                 humidity=None, traffic_density=None),
+        ]
+        got = pc.calculate_priorities_vectorized(**{k: [r[k] for r in rows] for k in rows[0]})
+        for g, row in zip(got, rows):
+            self.assertAlmostEqual(g, pc.calculate_single_priority(**row), places=12)
+
+    def test_model_candidates_are_nearest_in_range_nodes(self):
+        from types import SimpleNamespace
+        import numpy as np
+        from bins.utils.priority_calculator import priority_calculator as pc
+        nodes = [SimpleNamespace(id=i) for i in range(6)]
+        distances = np.array([900.0, 100.0, 5000.0, 300.0, 50.0, 200.0])
+        latest = {i: object() for i in range(6) if i != 4}
+        self.assertEqual(pc._model_candidates(nodes, distances, latest, None), {0, 1, 2, 3, 5})
+        # Node 4 has no reading and node 2 is past max_distance_m
+        self.assertEqual(pc._model_candidates(nodes, distances, latest, 3), {1, 3, 5})
+        self.assertEqual(pc._model_candidates(nodes, distances, latest, 10), {0, 1, 3, 5})
+
+
+class SubmitReadingTests(TestCase):
+    def test_batch_submit_uses_bulk_ingest(self):
+        import json
+        from bins.models import SensorReading
+        nodes = [Node.objects.create(name=f'B{i}') for i in range(2)]
+        batch = [{'node_id': n.id, 'waste_level': 0.1 * k, 'temperature': 25}
+                 for n in nodes for k in range(3)]
+        resp = self.client.post('/api/readings/submit/', json.dumps(batch),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(json.loads(resp.content)['created'], 6)
+        self.assertEqual(SensorReading.objects.count(), 6)
+
+        resp = self.client.post('/api/readings/submit/', json.dumps([{'node_id': 9999}]),
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(SensorReading.objects.count(), 6)
+
+
+class LatestReadingsApiTests(TestCase):
+    def test_latest_readings_api_streams_page_on_request_connection(self):
+        import json
+        from datetime import timedelta
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from bins.models import SensorReading
+        now = timezone.now()
+        nodes = [Node.objects.create(name=f'P{i}') for i in range(3)]
+        for i, node in enumerate(nodes):
+            SensorReading.objects.create(node=node, temperature=25, humidity=60, gas_level=0.1,
+                                         waste_level=0.1, timestamp=now - timedelta(hours=i))
+        self.client.force_login(User.objects.create_user('poll'))
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get('/api/readings/?limit=2')
+        self.assertTrue(resp.streaming)
+        readings = json.loads(b''.join(resp.streaming_content))['readings']
+        self.assertEqual([r['node']['id'] for r in readings], [nodes[0].id, nodes[1].id])
+        self.assertEqual(readings[0]['node']['last_update'], now.isoformat())
+        # Ran on this thread's connection; the aggregate covers only the page's nodes
+        grouped = [q['sql'] for q in queries if 'GROUP BY' in q['sql']]
+        self.assertEqual(len(grouped), 1)
+        self.assertIn(' IN (', grouped[0])
+
+
+class UserSettingLocationTests(TestCase):
+    def test_location_dict_is_cached_and_refreshed_on_save(self):
+        from django.contrib.auth.models import User
+        from bins.models import UserSetting
+        us = UserSetting.objects.create(user=User.objects.create_user('loc'))
+        self.assertIsNone(us.get_location_dict())
+        us.latitude, us.longitude, us.location_name = 23.8, 90.36, 'Mirpur'
+        us.save()
+        loc = us.get_location_dict()
+        self.assertEqual(loc, {'lat': 23.8, 'lng': 90.36, 'name': 'Mirpur'})
+        self.assertIs(us.get_location_dict(), loc)
+
+    def test_update_location_is_a_single_update(self):
+        import json
+        from django.contrib.auth.models import User
+        from bins.models import UserSetting
+        user = User.objects.create_user('mover', password='pw')
+        self.client.force_login(user)
+        body = json.dumps({'latitude': 23.81, 'longitude': 90.41, 'location_name': 'Gulshan'})
+        resp = self.client.post('/api/update-location/', body, content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(UserSetting.objects.get(user=user).get_location_dict(),
+                         {'lat': 23.81, 'lng': 90.41, 'name': 'Gulshan'})
+        before = UserSetting.objects.get(user=user).updated_at
+        body = json.dumps({'latitude': 23.75, 'longitude': 90.39})
+        resp = self.client.post('/api/update-location/', body, content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        us = UserSetting.objects.get(user=user)
+        self.assertEqual((us.latitude, us.longitude, us.location_name), (23.75, 90.39, ''))
+        self.assertGreater(us.updated_at, before)
+
+
+class CsrfEndpointTests(TestCase):
+    def test_csrf_endpoint_sets_cookie_without_db_queries(self):
+        import json
+        with self.assertNumQueries(0):
+            resp = self.client.get('/api/csrf/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('csrftoken', resp.cookies)
+        self.assertTrue(json.loads(resp.content)['csrfToken'])
+        self.assertIn('no-cache', resp['Cache-Control'])
+
+
+class CompressionTests(TestCase):
+    def test_large_json_responses_are_gzipped(self):
+        import gzip
+        import json
+        from django.contrib.auth.models import User
+        from bins.models import Notification
+        user = User.objects.create_user('gz', password='pw')
+        Notification.objects.bulk_create(
+            [Notification(user=user, message=f'Bin {i} is nearly full') for i in range(20)])
+        self.client.force_login(user)
+        resp = self.client.get('/api/v1/notifications/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertTrue(json.loads(gzip.decompress(resp.content)))
+        resp = self.client.get('/api/v1/notifications/')
+        self.assertFalse(resp.has_header('Content-Encoding'))
@@ -1,5 +1,6 @@
 import json
-from pathlib import Path
+import os
+from functools import lru_cache
 from django.conf import settings
 from joblib import dump, load
 
@@ -9,30 +10,57 @@ def model_path():
 def meta_path():
     return settings.MODEL_META_FILENAME
 
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+# Keyed on (path, mtime) so a rewritten file is picked up without an explicit
+# invalidation; save_model() still clears them for writes within one mtime tick.
+@lru_cache(maxsize=8)
+def _read_json_cached(path, mtime_ns):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+@lru_cache(maxsize=1)
+def _load_model_cached(path, mtime_ns):
+    return load(path)
+
+@lru_cache(maxsize=1)
+def _load_forward_cached(path, mtime_ns):
+    return load(path)
+
+def _clear_caches():
+    _read_json_cached.cache_clear()
+    _load_model_cached.cache_clear()
+    _load_forward_cached.cache_clear()
+
 def save_model(model, meta: dict):
     dump(model, model_path())
     with open(meta_path(), 'w') as f:
         json.dump(meta, f)
+    _clear_caches()
 
 def load_model():
-    p = model_path()
-    if Path(p).exists():
-        return load(p)
+    p = str(model_path())
+    mtime = _mtime_ns(p)
+    if mtime is not None:
+        return _load_model_cached(p, mtime)
     return None
 
 def get_model_version():
-    mp = meta_path()
-    if Path(mp).exists():
-        with open(mp, 'r') as f:
-            data = json.load(f)
-            return data.get('version', 'unknown')
+    mp = str(meta_path())
+    mtime = _mtime_ns(mp)
+    if mtime is not None:
+        return _read_json_cached(mp, mtime).get('version', 'unknown')
     return 'unknown'
 
 def load_meta():
-    mp = meta_path()
-    if Path(mp).exists():
-        with open(mp, 'r') as f:
-            return json.load(f)
+    mp = str(meta_path())
+    mtime = _mtime_ns(mp)
+    if mtime is not None:
+        return dict(_read_json_cached(mp, mtime))
     return {}
 
 
@@ -52,18 +80,29 @@ def save_forward_bundle(bundle: dict, meta: dict):
     dump(bundle, forward_path())
     with open(forward_meta_path(), 'w') as f:
         json.dump(meta, f)
+    _clear_caches()
 
 
 def load_forward_bundle():
-    p = forward_path()
-    if Path(p).exists():
-        return load(p)
+    """Cached per process like load_model(); callers must not mutate the bundle."""
+    p = str(forward_path())
+    mtime = _mtime_ns(p)
+    if mtime is not None:
+        return _load_forward_cached(p, mtime)
     return None
 
 
+def scoring_models_version():
+    """
+    Token that changes whenever either scoring artifact (the forward bundle
+    or the priority model) is rewritten; the files' mtimes, like the caches above.
+    """
+    return f'{_mtime_ns(str(forward_path()))}:{_mtime_ns(str(model_path()))}'
+
+
 def load_forward_meta():
-    mp = forward_meta_path()
-    if Path(mp).exists():
-        with open(mp, 'r') as f:
-            return json.load(f)
-    return {}
\ No newline at end of file
+    mp = str(forward_meta_path())
+    mtime = _mtime_ns(mp)
+    if mtime is not None:
+        return dict(_read_json_cached(mp, mtime))
+    return {}
@@ -153,14 +153,28 @@ def train_forward(test_frac: float = 0.2, random_state: int = 42):
 
 def predict_forward(bundle: dict, feature_row: dict):
     """Return risk-aware outputs for one engineered feature row."""
-    X = np.array([[feature_row.get(c, 0.0) for c in bundle["features"]]], dtype=float)
-    out = {"time_to_overflow_h": float(bundle["regressor"].predict(X)[0]),
-           "tto_p10_h": float(bundle["q10"].predict(X)[0]),
-           "tto_p90_h": float(bundle["q90"].predict(X)[0])}
-    if bundle.get("classifier") is not None:
-        out["hazard_prob"] = float(bundle["classifier"].predict_proba(X)[0, 1])
+    return predict_forward_batch(bundle, [feature_row])[0]
+
+
+def predict_forward_batch(bundle: dict, feature_rows: list):
+    """predict_forward for many rows, with one predict call per bundle model."""
+    X = np.array([[row.get(c, 0.0) for c in bundle["features"]] for row in feature_rows], dtype=float)
+    tto = bundle["regressor"].predict(X)
+    p10 = bundle["q10"].predict(X)
+    p90 = bundle["q90"].predict(X)
+    hazard = (bundle["classifier"].predict_proba(X)[:, 1]
+              if bundle.get("classifier") is not None else None)
     # risk-aware priority in [0,1]: closer overflow (P10) + hazard probability
     cap = bundle.get("tto_cap_h", TTO_CAP_H)
-    urgency = 1.0 - min(1.0, max(0.0, out["tto_p10_h"] / cap))
-    out["risk_priority"] = float(max(out.get("hazard_prob", 0.0), urgency))
-    return out
+    urgency = 1.0 - np.clip(p10 / cap, 0.0, 1.0)
+    risk = np.maximum(hazard, urgency) if hazard is not None else np.maximum(0.0, urgency)
+    outs = []
+    for i in range(len(X)):
+        out = {"time_to_overflow_h": float(tto[i]),
+               "tto_p10_h": float(p10[i]),
+               "tto_p90_h": float(p90[i])}
+        if hazard is not None:
+            out["hazard_prob"] = float(hazard[i])
+        out["risk_priority"] = float(risk[i])
+        outs.append(out)
+    return outs
@@ -1,4 +1,3 @@
-import math
 from datetime import datetime
 import numpy as np
 import pandas as pd
@@ -6,19 +5,10 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
 from django.utils import timezone
-from django.db.models import Avg
-from bins.models import SensorReading, Node, AICost
-from .model_store import save_model
-
-def _haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate haversine distance between two points in meters"""
-    R = 6371000.0  # Earth's radius in meters
-    phi1, phi2 = math.radians(lat1 or 0.0), math.radians(lat2 or 0.0)
-    dphi = math.radians((lat2 or 0.0) - (lat1 or 0.0))
-    dlambda = math.radians((lon2 or 0.0) - (lon1 or 0.0))
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
+from django.db.models import Avg, Count, F, FloatField, Max, Sum
+from bins.models import SensorReading, Node, AICost, latest_readings_for, recent_readings_for
+from .model_store import load_meta, load_model, save_model
+from ..geo import distance_to_point_m
 
 def _calculate_priority_score(distance_m, waste_level, gas_level, temperature, humidity, traffic_density):
     """
@@ -31,25 +21,28 @@ def _calculate_priority_score(distance_m, waste_level, gas_level, temperature, h
     
     Returns priority score from 0.0 to 1.0 (higher = more urgent)
     """
+    return float(_priority_scores(distance_m, waste_level, gas_level, temperature, humidity, traffic_density))
+
+def _priority_scores(distance_m, waste_level, gas_level, temperature, humidity, traffic_density):
+    """
+    Column-wise form of _calculate_priority_score: every argument may be a
+    scalar, ndarray or Series, and the whole column is scored in one NumPy pass.
+    """
     # Normalize distance (0-2000m range, inverted for priority)
-    distance_norm = max(0.0, min(1.0, distance_m / 2000.0))
-    distance_priority = 1.0 - distance_norm  # Closer = higher priority
-    
-    # Waste level priority (0.0-1.0, direct mapping)
-    waste_priority = max(0.0, min(1.0, waste_level))
+    distance_priority = 1.0 - np.clip(np.asarray(distance_m, dtype=float) / 2000.0, 0.0, 1.0)  # Closer = higher priority
     
-    # Gas level priority (0.0-1.0, direct mapping)
-    gas_priority = max(0.0, min(1.0, gas_level))
+    # Waste level and gas level priority (0.0-1.0, direct mapping)
+    waste_priority = np.clip(np.asarray(waste_level, dtype=float), 0.0, 1.0)
+    gas_priority = np.clip(np.asarray(gas_level, dtype=float), 0.0, 1.0)
     
     # Temperature priority (normalized around 25°C, higher deviation = higher priority)
-    temp_deviation = abs(temperature - 25.0) / 15.0  # ±15°C range
-    temp_priority = max(0.0, min(1.0, temp_deviation))
+    temp_priority = np.clip(np.abs(np.asarray(temperature, dtype=float) - 25.0) / 15.0, 0.0, 1.0)  # ±15°C range
     
     # Humidity priority (normalized, >70% = higher priority)
-    humidity_priority = max(0.0, min(1.0, (humidity - 50.0) / 50.0))
+    humidity_priority = np.clip((np.asarray(humidity, dtype=float) - 50.0) / 50.0, 0.0, 1.0)
 
     # Traffic priority (1.0 = heavy traffic = low priority to visit)
-    traffic_priority = 1.0 - max(0.0, min(1.0, traffic_density))
+    traffic_priority = 1.0 - np.clip(np.asarray(traffic_density, dtype=float), 0.0, 1.0)
     
     # Combined priority with weights
     priority = (
@@ -61,85 +54,172 @@ def _calculate_priority_score(distance_m, waste_level, gas_level, temperature, h
         0.15 * traffic_priority     # Traffic weight: 15%
     )
     
-    return max(0.0, min(1.0, priority))
+    return np.clip(priority, 0.0, 1.0)
+
+# Per-reading columns aggregated over each node's last 10 readings: (source, feature prefix)
+_STAT_COLUMNS = (
+    ('temperature', 'temperature'),
+    ('humidity', 'humidity'),
+    ('gas_level', 'gas'),
+    ('waste_level', 'waste'),
+    ('traffic_density', 'traffic'),
+)
+
+_READING_COLUMNS = (
+    'node_id', 'timestamp', 'temperature', 'humidity', 'gas_level',
+    'waste_level', 'traffic_density',
+)
 
 def _extract_features_df(user_lat=23.7806, user_lng=90.2794):
     """
     Build feature dataset for Random Forest training
     Uses actual priority calculation based on specifications
+
+    The database does the per-node work: one query returns each node's latest
+    reading (ROW_NUMBER window), one returns E[x] and E[x^2] over its last 10
+    readings, so only O(nodes) rows reach Python whatever the reading volume.
     """
-    readings = SensorReading.objects.select_related('node').order_by('node_id', '-timestamp')
-    rows = []
-    
-    # Group readings by node
-    node_groups = {}
-    for r in readings:
-        node_groups.setdefault(r.node_id, []).append(r)
-    
-    for node_id, items in node_groups.items():
-        node = items[0].node
-        latest_reading = items[0]
-        
-        # Calculate distance from user location
-        distance_m = _haversine_distance(
-            user_lat, user_lng, 
-            node.latitude or 0.0, node.longitude or 0.0
-        )
-        
-        # Calculate priority score as target variable
-        priority_score = _calculate_priority_score(
-            distance_m=distance_m,
-            waste_level=latest_reading.waste_level,
-            gas_level=latest_reading.gas_level,
-            temperature=latest_reading.temperature,
-            humidity=latest_reading.humidity,
-            traffic_density=getattr(latest_reading, 'traffic_density', 0.0)
-        )
-        
-        # Statistical features for better prediction
-        temperatures = [r.temperature for r in items[:10]]  # Last 10 readings
-        humidities = [r.humidity for r in items[:10]]
-        gas_levels = [r.gas_level for r in items[:10]]
-        waste_levels = [r.waste_level for r in items[:10]]
-        traffic_levels = [getattr(r, 'traffic_density', 0.0) for r in items[:10]]
-        
-        # Time-based features
-        hour = latest_reading.timestamp.hour
-        dow = latest_reading.timestamp.weekday()
-        
-        row = {
-            'node_id': node_id,
-            'latitude': node.latitude or 0.0,
-            'longitude': node.longitude or 0.0,
-            'distance_from_user': distance_m,
-            'temperature': latest_reading.temperature,
-            'humidity': latest_reading.humidity,
-            'gas_level': latest_reading.gas_level,
-            'waste_level': latest_reading.waste_level,
-            'traffic_density': getattr(latest_reading, 'traffic_density', 0.0),
-            'mean_temperature': np.mean(temperatures),
-            'std_temperature': np.std(temperatures) if len(temperatures) > 1 else 0.0,
-            'mean_humidity': np.mean(humidities),
-            'std_humidity': np.std(humidities) if len(humidities) > 1 else 0.0,
-            'mean_gas': np.mean(gas_levels),
-            'std_gas': np.std(gas_levels) if len(gas_levels) > 1 else 0.0,
-            'mean_waste': np.mean(waste_levels),
-            'std_waste': np.std(waste_levels) if len(waste_levels) > 1 else 0.0,
-            'mean_traffic': np.mean(traffic_levels),
-            'std_traffic': np.std(traffic_levels) if len(traffic_levels) > 1 else 0.0,
-            'hour': hour,
-            'day_of_week': dow,
-            'priority_score': priority_score  # Target variable
-        }
-        rows.append(row)
-    
-    df = pd.DataFrame(rows)
-    return df
+    latest = pd.DataFrame.from_records(
+        latest_readings_for().values_list(*_READING_COLUMNS),
+        columns=_READING_COLUMNS,
+    )
+    if latest.empty:
+        return pd.DataFrame()
+
+    # Coordinates come from one small Node query hash-joined on node_id
+    coords = pd.DataFrame.from_records(
+        Node.objects.values_list('id', 'latitude', 'longitude'),
+        columns=['node_id', 'latitude', 'longitude'],
+    ).set_index('node_id')
+    latest = latest.set_index('node_id').sort_index().join(coords, how='left')
+
+    # mean = E[x], std = sqrt(E[x^2] - E[x]^2) (population std, as np.std;
+    # 0.0 for a single reading), both from one GROUP BY over the last-10 window
+    stat_src = [src for src, _ in _STAT_COLUMNS]
+    moments = {}
+    for src in stat_src:
+        moments[f'{src}__mean'] = Avg(src)
+        moments[f'{src}__sq'] = Avg(F(src) * F(src))
+    window_ids = recent_readings_for(per_node=10).values('pk')
+    stats = pd.DataFrame.from_records(
+        SensorReading.objects.filter(pk__in=window_ids)
+        .values('node_id').annotate(**moments).order_by('node_id')
+    ).set_index('node_id').reindex(latest.index)
+    means = pd.DataFrame({src: stats[f'{src}__mean'].to_numpy() for src in stat_src}, index=latest.index)
+    stds = pd.DataFrame({
+        src: np.sqrt(np.clip(stats[f'{src}__sq'].to_numpy() - means[src].to_numpy() ** 2, 0.0, None))
+        for src in stat_src
+    }, index=latest.index)
+
+    lats = latest['latitude'].fillna(0.0)
+    lngs = latest['longitude'].fillna(0.0)
+    # Calculate distance from user location
+    distances = distance_to_point_m(user_lat, user_lng, lats.to_numpy(), lngs.to_numpy())
 
-def train_from_db(n_estimators=100, random_state=42, test_size=0.2):
+    out = pd.DataFrame({
+        'node_id': latest.index.to_numpy(),
+        'latitude': lats.to_numpy(),
+        'longitude': lngs.to_numpy(),
+        'distance_from_user': distances,
+        'temperature': latest['temperature'].to_numpy(),
+        'humidity': latest['humidity'].to_numpy(),
+        'gas_level': latest['gas_level'].to_numpy(),
+        'waste_level': latest['waste_level'].to_numpy(),
+        'traffic_density': latest['traffic_density'].to_numpy(),
+    })
+    # Statistical features for better prediction
+    for src, prefix in _STAT_COLUMNS:
+        out[f'mean_{prefix}'] = means[src].to_numpy()
+        out[f'std_{prefix}'] = stds[src].to_numpy()
+
+    # Time-based features
+    out['hour'] = [ts.hour for ts in latest['timestamp']]
+    out['day_of_week'] = [ts.weekday() for ts in latest['timestamp']]
+
+    # Calculate priority score as target variable
+    out['priority_score'] = _priority_scores(
+        distances, out['waste_level'].to_numpy(), out['gas_level'].to_numpy(),
+        out['temperature'].to_numpy(), out['humidity'].to_numpy(), out['traffic_density'].to_numpy(),
+    )
+    return out
+
+# Model input columns of the feature frame, in order (excludes node_id,
+# coordinates and the priority_score target)
+FEATURE_COLS = (
+    'distance_from_user', 'temperature', 'humidity', 'gas_level', 'waste_level', 'traffic_density',
+    'mean_temperature', 'std_temperature', 'mean_humidity', 'std_humidity',
+    'mean_gas', 'std_gas', 'mean_waste', 'std_waste', 'mean_traffic', 'std_traffic', 'hour', 'day_of_week'
+)
+
+# Tree-size bounds shared by every training run: depth and leaf limits keep each
+# tree (and so predict latency and the pickled model) small, and 'sqrt' features
+# cut the per-split search from all 18 features to 4.
+RF_PARAMS = {
+    'max_depth': 10,
+    'max_features': 'sqrt',
+    'min_samples_split': 2,
+    'min_samples_leaf': 2,
+}
+# Per-tree bootstrap fraction, applied once the training set is large enough for
+# subsampling to matter (smaller sets keep full-size bootstraps)
+RF_MAX_SAMPLES = 0.7
+RF_MAX_SAMPLES_MIN_ROWS = 1000
+
+def _data_fingerprint():
+    """
+    Reading part: [highest id, count, newest timestamp]. The id moves on every
+    insert (backfilled readings included), the count on deletes, and the
+    timestamp on edits that re-date a reading.
+    Node part: [highest id, count, id-weighted coordinate sums], since the
+    features join each node's latitude/longitude; the sums move when any
+    node is relocated. An unchanged value means the training data has not
+    changed. JSON-safe, as it is stored in the model meta.
+    """
+    readings = SensorReading.objects.aggregate(max_id=Max('id'), n=Count('id'), max_ts=Max('timestamp'))
+    max_ts = readings['max_ts'].isoformat() if readings['max_ts'] else None
+    nodes = Node.objects.aggregate(
+        max_id=Max('id'), n=Count('id'),
+        lat=Sum(F('id') * F('latitude'), output_field=FloatField()),
+        lng=Sum(F('id') * F('longitude'), output_field=FloatField()),
+    )
+    return [readings['max_id'], readings['n'], max_ts,
+            nodes['max_id'], nodes['n'], nodes['lat'], nodes['lng']]
+
+def _result_from_meta(meta):
+    """Rebuild train_from_db's return value from a saved meta dict."""
+    importances = meta.get('feature_importance', {})
+    return {
+        'meta': meta,
+        'feature_importances': [importances.get(c, 0.0) for c in meta.get('features', [])],
+        'validation_metrics': {
+            'mse': meta.get('validation_mse'),
+            'r2': meta.get('validation_r2'),
+            'n_train': meta.get('n_train'),
+            'n_test': meta.get('n_test'),
+        },
+        'retrained': False,
+    }
+
+def train_from_db(n_estimators=100, random_state=42, test_size=0.2, force=False):
     """
     Train Random Forest model for priority prediction
+
+    Skips retraining (returning the saved model's metadata) when the stored
+    model was trained with the same parameters and no reading was added since;
+    the data fingerprint lives in the saved meta so every worker sees it.
+    Pass force=True to retrain regardless.
     """
+    fingerprint = _data_fingerprint()
+    if not force:
+        meta = load_meta()
+        if (meta.get('data_fingerprint') == fingerprint
+                and meta.get('n_estimators') == n_estimators
+                and meta.get('random_state') == random_state
+                and meta.get('test_size') == test_size
+                and meta.get('rf_params') == RF_PARAMS
+                and load_model() is not None):
+            return _result_from_meta(meta)
+
     df = _extract_features_df()
     if df.empty:
         raise ValueError("No sensor data available to train.")
@@ -147,15 +227,12 @@ def train_from_db(n_estimators=100, random_state=42, test_size=0.2):
     if len(df) < 5:
         raise ValueError("Need at least 5 data points to train the model.")
     
-    # Define feature columns (exclude node_id and target)
-    feature_cols = [
-        'distance_from_user', 'temperature', 'humidity', 'gas_level', 'waste_level', 'traffic_density',
-        'mean_temperature', 'std_temperature', 'mean_humidity', 'std_humidity',
-        'mean_gas', 'std_gas', 'mean_waste', 'std_waste', 'mean_traffic', 'std_traffic', 'hour', 'day_of_week'
-    ]
+    feature_cols = list(FEATURE_COLS)
     
-    X = df[feature_cols].values
-    y = df['priority_score'].values
+    # sklearn trees split on float32 internally; handing over a C-contiguous
+    # float32 matrix skips its conversion copy and halves the matrix in memory
+    X = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32))
+    y = df['priority_score'].to_numpy()
     
     # Split data for training and validation
     if len(df) >= 10:
@@ -166,18 +243,21 @@ def train_from_db(n_estimators=100, random_state=42, test_size=0.2):
         # Use all data for training if dataset is small
         X_train, X_test, y_train, y_test = X, X, y, y
     
-    # Train Random Forest model
+    # Train Random Forest model (trees are independent, so build them on all cores)
     model = RandomForestRegressor(
         n_estimators=n_estimators, 
         random_state=random_state,
-        max_depth=10,
-        min_samples_split=2,
-        min_samples_leaf=1
+        max_samples=RF_MAX_SAMPLES if len(X_train) >= RF_MAX_SAMPLES_MIN_ROWS else None,
+        n_jobs=-1,
+        **RF_PARAMS
     )
     model.fit(X_train, y_train)
     
     # Validate model
     y_pred = model.predict(X_test)
+    # Serving predicts a handful of rows per request, where spinning up a worker
+    # per core costs more than it saves; persist the model single-threaded
+    model.set_params(n_jobs=None)
     mse = mean_squared_error(y_test, y_pred)
     r2 = r2_score(y_test, y_pred)
     
@@ -188,6 +268,12 @@ def train_from_db(n_estimators=100, random_state=42, test_size=0.2):
         'features': feature_cols,
         'n_samples': int(df.shape[0]),
         'n_estimators': n_estimators,
+        'random_state': random_state,
+        'test_size': test_size,
+        'rf_params': RF_PARAMS,
+        'n_train': len(X_train),
+        'n_test': len(X_test),
+        'data_fingerprint': fingerprint,
         'validation_mse': float(mse),
         'validation_r2': float(r2),
         'target': 'priority_score',
@@ -205,5 +291,6 @@ def train_from_db(n_estimators=100, random_state=42, test_size=0.2):
             'r2': float(r2),
             'n_train': len(X_train),
             'n_test': len(X_test)
-        }
+        },
+        'retrained': True,
     }
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Database helpers that depend on backend-specific catalog tables.
+"""
+from django.db import connections
+
+
+def estimated_row_count_sql(model, using='default'):
+    """
+    (sql, params) for a scalar SELECT of the planner's row estimate for
+    `model`'s table, ready to run alone or embed as a subquery; None when the
+    backend keeps no estimate.
+    """
+    vendor = connections[using].vendor
+    table = model._meta.db_table
+    if vendor == 'mysql':
+        return ('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+    if vendor == 'postgresql':
+        return 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table]
+    return None
+
+
+def estimated_row_count(model, using='default'):
+    """
+    The planner's row estimate for `model`'s table (O(1) catalog lookup), or
+    None when the backend keeps no estimate. Use only where an approximate
+    figure is acceptable: InnoDB's TABLE_ROWS can be off by tens of percent.
+    """
+    query = estimated_row_count_sql(model, using)
+    if query is None:
+        return None
+    with connections[using].cursor() as cursor:
+        cursor.execute(*query)
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -1,6 +1,12 @@
 import heapq
 import math
+from itertools import chain
+import numpy as np
 from django.conf import settings
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import csgraph_from_dense, dijkstra as csgraph_dijkstra
+from .geo import (distance_to_point_m, indexed_distance_m, nearest_neighbors_m, node_arrays,
+                  node_distance_matrix, pairwise_distance_m, path_distance_m)
 
 # Default features in case settings is missing them
 DEFAULT_DYNAMIC_FEATURES = {
@@ -11,7 +17,27 @@ def dijkstra(graph, source):
     """
     Standard Dijkstra's algorithm implementation
     graph: {u: [(v, w), ...]} where w is edge weight
+
+    Runs SciPy's C implementation over a CSR copy of the graph and returns
+    the same ({node: dist}, {node: prev}) dicts as the heapq version, which is
+    kept as a fallback for graphs with negative weights.
     """
+    ids, index_of, matrix = graph_to_csr(graph, extra_nodes=[source])
+    if matrix.data.size and matrix.data.min() < 0:
+        return _dijkstra_heapq(graph, source)
+    dist_row, pred_row = csgraph_dijkstra(
+        matrix, directed=True, indices=index_of[source], return_predecessors=True
+    )
+    dist_row = dist_row.tolist()
+    pred_row = pred_row.tolist()
+    # Same key sets as the heapq version: every graph node plus anything reached
+    inf = float('inf')
+    dist = {u: d for u, d in zip(ids, dist_row) if d < inf or u in graph}
+    prev = {u: (ids[p] if p >= 0 else None) for u, p in zip(ids, pred_row) if p >= 0 or u in graph}
+    return dist, prev
+
+def _dijkstra_heapq(graph, source):
+    """Pure-Python heapq Dijkstra over the adjacency dict (fallback for negative weights)."""
     dist = {u: float('inf') for u in graph}
     prev = {u: None for u in graph}
     dist[source] = 0.0
@@ -33,6 +59,38 @@ def dijkstra(graph, source):
     
     return dist, prev
 
+def graph_to_csr(graph, extra_nodes=()):
+    """
+    Convert an adjacency dict {u: [(v, w), ...]} into a SciPy CSR matrix.
+    Returns (ids, index_of, matrix) where ids[i] is the node id of row/column i.
+    Nodes that only appear as neighbours (or in `extra_nodes`) get empty rows.
+    """
+    ids = list(graph)
+    index_of = {u: i for i, u in enumerate(ids)}
+    targets = [v for u in ids for v, _ in graph[u]]
+    data = [w for u in ids for _, w in graph[u]]
+    for u in dict.fromkeys(chain(targets, extra_nodes)):
+        if u not in index_of:
+            index_of[u] = len(ids)
+            ids.append(u)
+    n = len(ids)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(graph[u]) for u in graph], out=indptr[1:len(graph) + 1])
+    indptr[len(graph) + 1:] = indptr[len(graph)]
+    indices = np.fromiter(map(index_of.__getitem__, targets), dtype=np.int64, count=len(targets))
+    matrix = csr_matrix((np.asarray(data, dtype=float), indices, indptr), shape=(n, n))
+    return ids, index_of, matrix
+
+def _path_from_predecessors(ids, pred_row, target_idx):
+    """Walk a csgraph predecessor row back from target_idx (-9999 marks the root)."""
+    path = []
+    cur = target_idx
+    while cur >= 0:
+        path.append(ids[cur])
+        cur = pred_row[cur]
+    path.reverse()
+    return path
+
 def reconstruct_path(prev, target):
     """Reconstruct path from source to target using predecessor array"""
     path = []
@@ -87,42 +145,93 @@ def calculate_edge_weight(base_distance_m, destination_priority, dynamic_costs=N
     weight = adjusted_distance / (1.0 + alpha * (priority * 10.0))
     return weight
 
-def build_priority_graph(nodes, priority_scores, traffic_scores=None, alpha=0.5):
+def _destination_factors(nodes, priority_scores, traffic_scores, alpha):
     """
-    Build graph with edge weights calculated based on node priorities and traffic
+    Per-destination multiplier f[v] such that weight(u->v) = base_distance(u, v) * f[v].
+    calculate_edge_weight is linear in the base distance, so its value at
+    distance 1.0 is exactly the factor applied to every edge into v. The
+    priority and traffic terms are normalised once per node, as arrays;
+    dict-valued traffic entries go through calculate_edge_weight itself.
+    """
+    node_ids = [n.id for n in nodes]
+    priority = np.clip(np.fromiter((priority_scores.get(nid, 0.0) for nid in node_ids),
+                               dtype=float, count=len(node_ids)), 0.0, 1.0)
+    # In current implementation traffic_scores primarily held density floats;
+    # a dict is a full dynamic_costs mapping, anything else (None) adds no cost
+    traffic = [traffic_scores.get(nid, 0.0) for nid in node_ids]
+    numeric = np.array([isinstance(t, (int, float)) for t in traffic], dtype=bool)
+    density = np.array([float(t) if ok else 0.0 for t, ok in zip(traffic, numeric)])
+
+    multiplier = np.ones(len(node_ids))
+    feature_config = getattr(settings, 'DYNAMIC_FEATURES', DEFAULT_DYNAMIC_FEATURES)
+    config = feature_config.get('traffic_density')
+    if config and config.get('type') == 'cost_multiplier':
+        min_v = config.get('min_val', 0.0)
+        max_v = config.get('max_val', 1.0)
+        if max_v > min_v:
+            norm = np.clip((density - min_v) / (max_v - min_v), 0.0, 1.0)
+            multiplier = 1.0 + norm * config.get('routing_weight', 1.0)
+
+    factors = multiplier / (1.0 + alpha * (priority * 10.0))
+    for j in np.flatnonzero(~numeric):
+        nid = node_ids[j]
+        dynamic_costs = traffic[j] if isinstance(traffic[j], dict) else None
+        factors[j] = calculate_edge_weight(1.0, priority_scores.get(nid, 0.0), dynamic_costs, alpha)
+    return factors
+
+def priority_weight_matrix(nodes, priority_scores, traffic_scores=None, alpha=0.5, factors=None):
+    """
+    Dense N x N float32 edge-weight matrix of the priority graph: entry [i, j] is the
+    weight of nodes[i] -> nodes[j] (see calculate_edge_weight); the diagonal is 0.
+    Pass `factors` (from _destination_factors) to reuse ones already computed;
+    `nodes` may then be a NodeArrays.
+
+    Distances come from the cached node distance matrix scaled column-wise by
+    the destination factors, so a repeat call with new priorities is one
+    broadcast multiply.
     """
     if traffic_scores is None:
         traffic_scores = {}
 
+    base = node_distance_matrix(nodes)
+    if factors is None:
+        factors = _destination_factors(nodes, priority_scores, traffic_scores, alpha)
+    weights = base * factors.astype(np.float32)[None, :]
+    np.fill_diagonal(weights, 0.0)
+    return weights
+
+def _adjacency_from_matrix(node_ids, weights):
+    """{u: [(v, w), ...]} for every ordered pair u != v of a dense weight matrix."""
     graph = {}
-    node_ids = [n.id for n in nodes]
-    
-    for node_id in node_ids:
-        graph[node_id] = []
-    
-    for i, node_u in enumerate(nodes):
-        for j, node_v in enumerate(nodes):
-            if i == j:
-                continue
-            
-            base_distance = haversine_distance(
-                node_u.latitude or 0.0, node_u.longitude or 0.0,
-                node_v.latitude or 0.0, node_v.longitude or 0.0
-            )
-            
-            dest_priority = priority_scores.get(node_v.id, 0.0)
-            
-            # Extract all dynamic costs for node_v from traffic_scores context
-            # In current implementation traffic_scores primarily held density, 
-            # we adapt it into a dynamic_costs dictionary for the new algorithm if it's a float
-            v_traffic = traffic_scores.get(node_v.id, 0.0)
-            dynamic_costs = {'traffic_density': v_traffic} if isinstance(v_traffic, (int, float)) else v_traffic
-            
-            weight = calculate_edge_weight(base_distance, dest_priority, dynamic_costs, alpha)
-            graph[node_u.id].append((node_v.id, weight))
-    
+    for i, (u, row) in enumerate(zip(node_ids, weights.tolist())):
+        graph[u] = [(v, w) for j, (v, w) in enumerate(zip(node_ids, row)) if j != i]
     return graph
 
+def build_priority_graph(nodes, priority_scores, traffic_scores=None, alpha=0.5, k_neighbors=None):
+    """
+    Build graph with edge weights calculated based on node priorities and traffic
+
+    With ``k_neighbors`` each node only gets edges to its k nearest neighbours
+    (picked with a haversine BallTree), giving N*k edges instead of N*(N-1)
+    for large fleets. Edge weights use the same distance metric as the dense
+    path, so a kept edge weighs the same either way.
+    """
+    if not nodes:
+        return {}
+    arrays = node_arrays(nodes)
+    node_ids = arrays.ids.tolist()
+    factors = _destination_factors(nodes, priority_scores, traffic_scores or {}, alpha)
+    if k_neighbors is None or k_neighbors >= len(nodes) - 1:
+        weights = priority_weight_matrix(arrays, priority_scores, traffic_scores, alpha, factors=factors)
+        return _adjacency_from_matrix(node_ids, weights)
+
+    _, idx = nearest_neighbors_m(arrays.lats, arrays.lngs, k_neighbors)
+    dist = indexed_distance_m(arrays.lats, arrays.lngs, np.arange(len(node_ids))[:, None], idx)
+    # float32 like priority_weight_matrix
+    weights = (dist.astype(np.float32) * factors.astype(np.float32)[idx]).tolist()
+    return {u: [(node_ids[j], w) for j, w in zip(row_idx, row_w)]
+            for u, row_idx, row_w in zip(node_ids, idx.tolist(), weights)}
+
 def compute_optimal_route(nodes, priority_scores, traffic_scores=None, source_node_id=None, user_location=None, alpha=0.5, refine=True):
     """
     Compute optimal route using Dijkstra's algorithm with priority-based edge weights.
@@ -138,24 +247,26 @@ def compute_optimal_route(nodes, priority_scores, traffic_scores=None, source_no
     if not nodes:
         raise ValueError("No nodes provided for routing")
     
-    graph = build_priority_graph(nodes, priority_scores, traffic_scores, alpha)
+    # Ids and coordinates are read off the nodes once, as contiguous arrays
+    arrays = node_arrays(nodes)
+    node_ids = arrays.ids.tolist()
+    size = len(node_ids)
+    factors = _destination_factors(nodes, priority_scores, traffic_scores, alpha)
+    weights = priority_weight_matrix(arrays, priority_scores, traffic_scores, alpha, factors=factors)
+    
+    # Search runs on a contiguous (N+1) x (N+1) array: rows/cols 0..N-1 are
+    # `nodes`, row N is the route origin when it is not one of them (the
+    # virtual user-location source, or an unknown source id). inf = no edge.
+    dense = np.full((size + 1, size + 1), np.inf)
+    dense[:size, :size] = weights
+    np.fill_diagonal(dense, np.inf)
     
     virtual_source = None
     if user_location and 'lat' in user_location and 'lng' in user_location:
         virtual_source = 'user_location'
-        graph[virtual_source] = []
-        
-        for node in nodes:
-            base_distance = haversine_distance(
-                user_location['lat'], user_location['lng'],
-                node.latitude or 0.0, node.longitude or 0.0
-            )
-            dest_priority = priority_scores.get(node.id, 0.0)
-            v_traffic = traffic_scores.get(node.id, 0.0)
-            dynamic_costs = {'traffic_density': v_traffic} if isinstance(v_traffic, (int, float)) else v_traffic
-            
-            weight = calculate_edge_weight(base_distance, dest_priority, dynamic_costs, alpha)
-            graph[virtual_source].append((node.id, weight))
+        base = distance_to_point_m(user_location['lat'], user_location['lng'],
+                                   arrays.lats, arrays.lngs)
+        dense[size, :size] = base * factors
     
     # Determine source
     if virtual_source:
@@ -164,36 +275,38 @@ def compute_optimal_route(nodes, priority_scores, traffic_scores=None, source_no
         source = source_node_id
     else:
         source = nodes[0].id  # Default to first node
+    index_of = {nid: i for i, nid in enumerate(node_ids)}
     
-    # Run Dijkstra's algorithm
-    distances, predecessors = dijkstra(graph, source)
+    if size and np.ptp(factors) == 0.0:
+        # Every edge is the (metric) base distance times one shared factor, so the
+        # triangle inequality holds and each direct edge already is a shortest
+        # path: skip the search. (With unequal factors a detour through a
+        # high-priority bin can undercut the direct edge, so it can't be skipped.)
+        all_dist = dense.copy()
+        np.fill_diagonal(all_dist, 0.0)
+    else:
+        # All-pairs shortest paths once (SciPy's C Dijkstra); every greedy hop
+        # below is then a masked argmin over one precomputed row. null_value=inf
+        # keeps zero-length edges between co-located bins.
+        all_dist = csgraph_dijkstra(csgraph_from_dense(dense, null_value=np.inf), directed=True)
     
     # Create optimal visiting order (greedy approach visiting nearest unvisited high-priority nodes)
-    unvisited = set(n.id for n in nodes)
+    unvisited = np.ones(size, dtype=bool)
     route_path = []
     total_cost = 0.0
-    current = source
-    
-    # If starting from virtual source, move to best first node
-    if virtual_source and unvisited:
-        best_first = min(unvisited, key=lambda nid: distances.get(nid, float('inf')))
-        route_path.append(best_first)
-        total_cost += distances.get(best_first, 0.0)
-        current = best_first
-        unvisited.remove(best_first)
+    current = index_of.get(source, size)
     
-    # Visit remaining nodes in order of proximity and priority
-    while unvisited:
-        # Recalculate distances from current position
-        current_distances, _ = dijkstra(graph, current)
+    # Visit nodes in order of proximity and priority (the first hop leaves the
+    # virtual source when starting from the user's location)
+    while unvisited.any():
+        remaining = np.flatnonzero(unvisited)
+        hop = all_dist[current, remaining]
+        k = remaining[int(np.argmin(hop))]
         
-        # Choose next node (nearest among remaining)
-        next_node = min(unvisited, key=lambda nid: current_distances.get(nid, float('inf')))
-        
-        route_path.append(next_node)
-        total_cost += current_distances.get(next_node, 0.0)
-        current = next_node
-        unvisited.remove(next_node)
+        route_path.append(node_ids[k])
+        total_cost += float(all_dist[current, k])
+        current = k
+        unvisited[k] = False
 
     # Optional deterministic local-search refinement on REAL distances.
     if refine and len(route_path) >= 4:
@@ -214,7 +327,10 @@ def compute_optimal_route(nodes, priority_scores, traffic_scores=None, source_no
         'alpha': alpha,
         'priority_scores': priority_scores,
         'source_type': 'user_location' if virtual_source else 'node',
-        'graph_edges': graph,
+        # Edge u -> v weighs weight_matrix[i, j] with i, j the positions of
+        # u, v in node_ids (a dense array instead of N^2 adjacency tuples)
+        'node_ids': node_ids,
+        'weight_matrix': weights,
         'refined': bool(refine and len(route_path) >= 4),
     }
 
@@ -237,71 +353,91 @@ def _coord_map(nodes):
 
 
 def _order_distance(order, coords, depot_coord):
-    """Real great-circle distance of visiting `order`, out-and-back to depot."""
+    """
+    Real distance of visiting `order`, out-and-back to depot, in the same
+    metric as _tour_matrix so budget checks agree with the local search.
+    """
     if not order:
         return 0.0
     la, lo = depot_coord
-    d = haversine_distance(la, lo, *coords[order[0]])
-    for a, b in zip(order[:-1], order[1:]):
-        d += haversine_distance(*coords[a], *coords[b])
-    d += haversine_distance(*coords[order[-1]], la, lo)
-    return d
+    return path_distance_m([la] + [coords[u][0] for u in order] + [la],
+                            [lo] + [coords[u][1] for u in order] + [lo])
+
+
+def _tour_matrix(order, coords, depot_coord):
+    """
+    Real-distance matrix for a tour as nested lists: index 0 is the depot and
+    index p (1..len(order)) is order[p - 1]. Lists keep scalar lookups cheap
+    in the local-search loops below.
+    """
+    lats = [depot_coord[0]] + [coords[u][0] for u in order]
+    lngs = [depot_coord[1]] + [coords[u][1] for u in order]
+    return pairwise_distance_m(lats, lngs).tolist()
 
 
 def two_opt_order(order, coords, depot_coord, max_pass=30):
-    """2-opt improvement of a visiting order using real distances."""
+    """
+    2-opt improvement of a visiting order using real distances.
+
+    Distances come from one precomputed matrix and each candidate reversal is
+    scored by its O(1) change in tour length (two edges out, two in) instead of
+    re-summing the whole tour.
+    """
     if len(order) < 4:
         return order[:]
-    seq = [None] + order[:] + [None]           # sentinels for depot at both ends
-
-    def dist(i, j):
-        ci = depot_coord if seq[i] is None else coords[seq[i]]
-        cj = depot_coord if seq[j] is None else coords[seq[j]]
-        return haversine_distance(ci[0], ci[1], cj[0], cj[1])
+    D = _tour_matrix(order, coords, depot_coord)
+    seq = [0] + list(range(1, len(order) + 1)) + [0]   # depot (0) at both ends
 
-    def total():
-        return sum(dist(i, i + 1) for i in range(len(seq) - 1))
-
-    cur = total(); improved = True; passes = 0
+    improved = True; passes = 0
     while improved and passes < max_pass:
         improved = False; passes += 1
         for i in range(1, len(seq) - 2):
             for k in range(i + 1, len(seq) - 1):
                 if k - i == 1:
                     continue
-                new = seq[:i] + seq[i:k + 1][::-1] + seq[k + 1:]
-                nt = sum(
-                    haversine_distance(
-                        *(depot_coord if new[p] is None else coords[new[p]]),
-                        *(depot_coord if new[p + 1] is None else coords[new[p + 1]])
-                    ) for p in range(len(new) - 1)
-                )
-                if nt + 1e-6 < cur:
-                    seq = new; cur = nt; improved = True
-    return [x for x in seq if x is not None]
+                a, b, c, e = seq[i - 1], seq[i], seq[k], seq[k + 1]
+                if D[a][c] + D[b][e] - D[a][b] - D[c][e] < -1e-6:
+                    seq[i:k + 1] = seq[i:k + 1][::-1]
+                    improved = True
+    return [order[p - 1] for p in seq[1:-1]]
 
 
 def or_opt_order(order, coords, depot_coord, seg_sizes=(1, 2, 3), max_pass=10):
-    """Or-opt: relocate short segments to cheaper positions (real distance)."""
-    seq = order[:]
+    """
+    Or-opt: relocate short segments to cheaper positions (real distance).
+
+    Each relocation is priced incrementally from a precomputed distance matrix:
+    the cost of closing the gap the segment leaves plus the cost of opening
+    the insertion point.
+    """
+    if not order:
+        return []
+    D = _tour_matrix(order, coords, depot_coord)
+    seq = list(range(1, len(order) + 1))
     improved = True; passes = 0
     while improved and passes < max_pass:
         improved = False; passes += 1
-        cur = _order_distance(seq, coords, depot_coord)
+        tour = [0] + seq + [0]
+        cur = sum(D[tour[p]][tour[p + 1]] for p in range(len(tour) - 1))
         for s in seg_sizes:
             for i in range(0, len(seq) - s + 1):
                 seg = seq[i:i + s]
                 rest = seq[:i] + seq[i + s:]
+                head, tail = seg[0], seg[-1]
+                before = seq[i - 1] if i > 0 else 0
+                after = seq[i + s] if i + s < len(seq) else 0
+                rest_len = cur - D[before][head] - D[tail][after] + D[before][after]
                 for j in range(0, len(rest) + 1):
-                    cand = rest[:j] + seg + rest[j:]
-                    if _order_distance(cand, coords, depot_coord) + 1e-6 < cur:
-                        seq = cand; improved = True
+                    a = rest[j - 1] if j > 0 else 0
+                    b = rest[j] if j < len(rest) else 0
+                    if rest_len - D[a][b] + D[a][head] + D[tail][b] + 1e-6 < cur:
+                        seq = rest[:j] + seg + rest[j:]; improved = True
                         break
                 if improved:
                     break
             if improved:
                 break
-    return seq
+    return [order[p - 1] for p in seq]
 
 
 def orienteering_route(nodes, priority_scores, user_location, budget_m, alpha=0.5):
@@ -309,20 +445,30 @@ def orienteering_route(nodes, priority_scores, user_location, budget_m, alpha=0.
     Prize-collecting orienteering: greedily insert the node with the best
     prize/added-distance ratio while the tour stays within `budget_m`.
     Returns {'path', 'total_distance_m', 'collected_priority'}.
+
+    All pairwise distances are taken once from a precomputed matrix, so each
+    candidate insertion costs three lookups (edge a->b replaced by a->j->b)
+    instead of two full tour re-sums of scalar haversine calls.
     """
     coords = _coord_map(nodes)
     depot = (user_location['lat'], user_location['lng']) if user_location else \
         (nodes[0].latitude or 0.0, nodes[0].longitude or 0.0)
+    ids = list(coords)
+    D = _tour_matrix(ids, coords, depot)
+    pos_of = {nid: p for p, nid in enumerate(ids, 1)}   # 0 is the depot
     remaining = set(n.id for n in nodes)
     order = []
     while remaining:
         best_j, best_ratio, best_pos = None, -1.0, None
         seq = order
+        stops = [0] + [pos_of[u] for u in seq] + [0]
         for j in remaining:
+            pj = pos_of[j]
+            Dj = D[pj]
             best_add, best_at = None, None
             for pos in range(len(seq) + 1):
-                trial = seq[:pos] + [j] + seq[pos:]
-                add = _order_distance(trial, coords, depot) - _order_distance(seq, coords, depot)
+                a, b = stops[pos], stops[pos + 1]
+                add = Dj[a] + Dj[b] - D[a][b]
                 if best_add is None or add < best_add:
                     best_add, best_at = add, pos
             ratio = priority_scores.get(j, 0.0) / max(best_add, 1.0)
@@ -356,27 +502,42 @@ def compute_route(graph, source, targets=None):
     """
     Legacy function for backward compatibility
     Enhanced to support the new priority-based routing
+
+    The graph is converted to CSR once and SciPy's C Dijkstra is run from the
+    source and every target in a single call; each greedy hop then only reads
+    the precomputed distance/predecessor rows. Graphs with negative weights
+    take the per-hop dijkstra() path (and so its heapq fallback).
     """
     if not targets:
         # Return distances tree
         dist, prev = dijkstra(graph, source)
         return {'source': source, 'distances': dist, 'tree_prev': prev}
-    
+
+    targets = list(targets)
+    ids, index_of, matrix = graph_to_csr(graph, extra_nodes=[source] + targets)
+    if matrix.data.size and matrix.data.min() < 0:
+        return _compute_route_per_hop(graph, source, targets)
+    src_idx = index_of[source]
+
+    # One C-level Dijkstra per possible hop origin (the source and each target)
+    origins = list(dict.fromkeys([src_idx] + [index_of[t] for t in targets]))
+    dist_rows, pred_rows = csgraph_dijkstra(matrix, indices=origins, return_predecessors=True)
+    row_of = {idx: k for k, idx in enumerate(origins)}
+
     # Multi-target route optimization
     route_path = []
     total_cost = 0.0
-    current = source
-    remaining = list(targets)
+    current = src_idx
+    remaining = [index_of[t] for t in targets]
     
     while remaining:
-        # Find shortest path to all remaining targets
-        dist, prev = dijkstra(graph, current)
+        dist = dist_rows[row_of[current]]
         
         # Choose nearest target
-        nearest = min(remaining, key=lambda t: dist.get(t, float('inf')))
+        nearest = min(remaining, key=lambda t: dist[t])
         
         # Reconstruct path segment
-        segment = reconstruct_path(prev, nearest)
+        segment = _path_from_predecessors(ids, pred_rows[row_of[current]], nearest)
         
         # Add segment to route (avoid duplicating current node)
         if route_path and segment and segment[0] == route_path[-1]:
@@ -384,7 +545,7 @@ def compute_route(graph, source, targets=None):
         else:
             route_path.extend(segment)
         
-        total_cost += dist.get(nearest, 0.0)
+        total_cost += float(dist[nearest])
         current = nearest
         remaining.remove(nearest)
     
@@ -392,4 +553,29 @@ def compute_route(graph, source, targets=None):
         'path': route_path, 
         'total_cost': total_cost,
         'alpha': getattr(graph, 'alpha', 0.5) if hasattr(graph, 'alpha') else 0.5
+    }
+
+def _compute_route_per_hop(graph, source, targets):
+    """compute_route's greedy tour with one dijkstra() call per hop (negative-weight graphs)."""
+    route_path = []
+    total_cost = 0.0
+    current = source
+    remaining = list(targets)
+
+    while remaining:
+        dist, prev = dijkstra(graph, current)
+        nearest = min(remaining, key=lambda t: dist.get(t, float('inf')))
+        segment = reconstruct_path(prev, nearest)
+        if route_path and segment and segment[0] == route_path[-1]:
+            route_path.extend(segment[1:])
+        else:
+            route_path.extend(segment)
+        total_cost += dist.get(nearest, 0.0)
+        current = nearest
+        remaining.remove(nearest)
+
+    return {
+        'path': route_path,
+        'total_cost': total_cost,
+        'alpha': getattr(graph, 'alpha', 0.5) if hasattr(graph, 'alpha') else 0.5
     }
\ No newline at end of file
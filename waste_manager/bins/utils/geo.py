@@ -0,0 +1,242 @@
+"""
+Vectorized great-circle helpers shared by routing, priority and training code.
+All inputs are degrees; outputs are meters.
+"""
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import QuerySet
+
+EARTH_RADIUS_M = 6371000.0
+
+# Widest lat/lng span (degrees, ~20 km) served by the equirectangular fast path;
+# beyond it the flat-earth error grows past ~0.5% and haversine is used instead.
+EQUIRECT_MAX_SPAN_DEG = 0.2
+
+
+def pairwise_haversine_m(lats, lngs):
+    """
+    N x N haversine distance matrix for N points, computed in one NumPy pass.
+
+    All sines and cosines are taken per node (O(N)); the half-angle
+    differences come from sin(x - y) = sin x cos y - cos x sin y, so the N^2
+    part is multiplies plus the final arcsin/sqrt.
+    """
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    sin_hlat, cos_hlat = np.sin(lat / 2), np.cos(lat / 2)
+    sin_hlng, cos_hlng = np.sin(lng / 2), np.cos(lng / 2)
+    cos_lat = np.cos(lat)
+    # The N x N steps run in place on two buffers, so no extra temporaries
+    # are allocated (and swept through memory) for each operation.
+    a = np.outer(sin_hlat, cos_hlat)
+    a -= np.outer(cos_hlat, sin_hlat)      # sin(dphi / 2)
+    a *= a
+    t = np.outer(sin_hlng, cos_hlng)
+    t -= np.outer(cos_hlng, sin_hlng)      # sin(dlambda / 2)
+    t *= t
+    t *= cos_lat[:, None]
+    t *= cos_lat[None, :]
+    a += t
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_M
+    return a
+
+
+def haversine_to_point_m(lat, lng, lats, lngs):
+    """Distances from one point (lat, lng) to each of N points, as a length-N array."""
+    lat0, lng0 = np.radians(float(lat or 0.0)), np.radians(float(lng or 0.0))
+    lat1 = np.radians(np.asarray(lats, dtype=float))
+    lng1 = np.radians(np.asarray(lngs, dtype=float))
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lng1 - lng0) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def path_haversine_m(lats, lngs):
+    """Total haversine length of the polyline through N points, in one NumPy pass."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    if lat.size < 2:
+        return 0.0
+    cos_lat = np.cos(lat)
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + cos_lat[:-1] * cos_lat[1:] * np.sin(np.diff(lng) / 2) ** 2)
+    return float(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))).sum())
+
+
+def nearest_neighbors_m(lats, lngs, k):
+    """
+    The k nearest other points of each of N points by haversine distance, via
+    a BallTree (O(N k log N), no N x N matrix). Returns (dist_m, idx), both
+    N x min(k, N - 1) arrays sorted nearest first.
+    """
+    from sklearn.neighbors import BallTree
+    pts = np.radians(np.column_stack([np.asarray(lats, dtype=float),
+                                      np.asarray(lngs, dtype=float)]))
+    n = len(pts)
+    k = max(0, min(int(k), n - 1))
+    if k == 0:
+        return np.empty((n, 0)), np.empty((n, 0), dtype=np.intp)
+    dist, idx = BallTree(pts, metric='haversine').query(pts, k=k + 1)
+    # Drop each point itself (not necessarily column 0 when points coincide)
+    keep = idx != np.arange(n)[:, None]
+    keep[keep.sum(axis=1) > k, -1] = False
+    return (dist[keep].reshape(n, k) * EARTH_RADIUS_M,
+            idx[keep].reshape(n, k))
+
+def _use_equirect(lats, lngs):
+    if not getattr(settings, 'ROUTING_EQUIRECT_DISTANCE', False) or len(lats) == 0:
+        return False
+    return (np.ptp(lats) <= EQUIRECT_MAX_SPAN_DEG
+            and np.ptp(lngs) <= EQUIRECT_MAX_SPAN_DEG)
+
+
+def _equirect_xy(lats, lngs, ref_lat_deg):
+    """Project to a local plane (radians scaled by cos of one reference latitude)."""
+    return np.radians(lngs) * np.cos(np.radians(ref_lat_deg)), np.radians(lats)
+
+
+def pairwise_distance_m(lats, lngs):
+    """
+    N x N distance matrix. For city-scale point sets (ROUTING_EQUIRECT_DISTANCE)
+    uses the equirectangular projection, which needs no per-pair trig and is
+    within ~0.05% of haversine at Dhaka's extent; otherwise pairwise_haversine_m.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if not _use_equirect(lats, lngs):
+        return pairwise_haversine_m(lats, lngs)
+    x, y = _equirect_xy(lats, lngs, lats.mean())
+    d = np.subtract.outer(x, x)
+    d *= d
+    dy = np.subtract.outer(y, y)
+    dy *= dy
+    d += dy
+    np.sqrt(d, out=d)
+    d *= EARTH_RADIUS_M
+    return d
+
+
+def indexed_distance_m(lats, lngs, rows, cols):
+    """
+    Distances between points rows[...] and cols[...] (index arrays of any
+    broadcastable shape) with the same equirect/haversine choice and reference
+    latitude as pairwise_distance_m over the whole point set, so sparse edge
+    lists agree with the dense matrix without building it.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if not _use_equirect(lats, lngs):
+        lat, lng = np.radians(lats), np.radians(lngs)
+        a = (np.sin((lat[cols] - lat[rows]) / 2) ** 2
+             + np.cos(lat[rows]) * np.cos(lat[cols]) * np.sin((lng[cols] - lng[rows]) / 2) ** 2)
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    x, y = _equirect_xy(lats, lngs, lats.mean())
+    return EARTH_RADIUS_M * np.hypot(x[cols] - x[rows], y[cols] - y[rows])
+
+
+def distance_to_point_m(lat, lng, lats, lngs):
+    """Point-to-many counterpart of pairwise_distance_m."""
+    lat, lng = float(lat or 0.0), float(lng or 0.0)
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    all_lats, all_lngs = np.append(lats, lat), np.append(lngs, lng)
+    if not _use_equirect(all_lats, all_lngs):
+        return haversine_to_point_m(lat, lng, lats, lngs)
+    x, y = _equirect_xy(all_lats, all_lngs, all_lats.mean())
+    dx = x[:-1] - x[-1]
+    dy = y[:-1] - y[-1]
+    return EARTH_RADIUS_M * np.sqrt(dx * dx + dy * dy)
+
+
+class NodeArrays(NamedTuple):
+    """Node ids and coordinates as parallel arrays (missing coordinates are 0.0)."""
+    ids: np.ndarray
+    lats: np.ndarray
+    lngs: np.ndarray
+
+
+def node_arrays(nodes):
+    """
+    NodeArrays for a Node queryset (read with one values_list query), an
+    iterable of Node-like objects, or an existing NodeArrays (returned as is).
+    Hot paths convert once and then work on contiguous arrays instead of
+    reading attributes off every node again.
+    """
+    if isinstance(nodes, NodeArrays):
+        return nodes
+    if isinstance(nodes, QuerySet):
+        rows = list(nodes.values_list('id', 'latitude', 'longitude'))
+    else:
+        rows = [(n.id, n.latitude, n.longitude) for n in nodes]
+    count = len(rows)
+    return NodeArrays(
+        ids=np.fromiter((r[0] for r in rows), dtype=np.int64, count=count),
+        lats=np.fromiter((r[1] or 0.0 for r in rows), dtype=float, count=count),
+        lngs=np.fromiter((r[2] or 0.0 for r in rows), dtype=float, count=count),
+    )
+
+
+# Byte budget for cached distance matrices per process. Every distinct node
+# subset (dashboard, route candidates, route + start point) gets its own entry,
+# so entries are evicted least recently used until the total fits, and a matrix
+# larger than the whole budget (~4k nodes at float32) is computed but not kept.
+DISTANCE_MATRIX_CACHE_BYTES = 64 * 1024 * 1024
+
+_matrix_cache = OrderedDict()
+_matrix_cache_bytes = 0
+_matrix_cache_lock = threading.Lock()
+
+
+def _distance_matrix(lats, lngs, equirect):
+    global _matrix_cache_bytes
+    key = (lats.tobytes(), lngs.tobytes(), equirect)
+    with _matrix_cache_lock:
+        dist = _matrix_cache.get(key)
+        if dist is not None:
+            _matrix_cache.move_to_end(key)
+            return dist
+    # float32: ~0.1 mm resolution at city distances and half the memory per
+    # cached matrix (and per weight matrix scaled from it)
+    dist = pairwise_distance_m(lats, lngs).astype(np.float32)
+    dist.setflags(write=False)  # shared between callers; scale into a new array
+    if dist.nbytes > DISTANCE_MATRIX_CACHE_BYTES:
+        return dist
+    with _matrix_cache_lock:
+        if key not in _matrix_cache:
+            _matrix_cache[key] = dist
+            _matrix_cache_bytes += dist.nbytes
+            while _matrix_cache_bytes > DISTANCE_MATRIX_CACHE_BYTES:
+                _, evicted = _matrix_cache.popitem(last=False)
+                _matrix_cache_bytes -= evicted.nbytes
+        return _matrix_cache[key]
+
+
+def node_distance_matrix(nodes):
+    """
+    pairwise_distance_m over nodes' coordinates (nodes or NodeArrays), cached
+    by the ordered coordinates within DISTANCE_MATRIX_CACHE_BYTES: node
+    positions rarely change between requests, so repeat routing calls only
+    rebuild the priority-dependent weights.
+    The returned array is read-only float32.
+    """
+    arrays = node_arrays(nodes)
+    equirect = bool(getattr(settings, 'ROUTING_EQUIRECT_DISTANCE', False))
+    return _distance_matrix(arrays.lats, arrays.lngs, equirect)
+
+
+def path_distance_m(lats, lngs):
+    """Polyline counterpart of pairwise_distance_m (same equirect/haversine choice)."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if lats.size < 2:
+        return 0.0
+    if not _use_equirect(lats, lngs):
+        return path_haversine_m(lats, lngs)
+    x, y = _equirect_xy(lats, lngs, lats.mean())
+    return float(EARTH_RADIUS_M * np.hypot(np.diff(x), np.diff(y)).sum())
@@ -2,12 +2,16 @@
 Priority calculation system for smart waste bin routing
 Implements the specified priority rules for dynamic node prioritization
 """
-import math
+import hashlib
+import heapq
 from typing import Dict, List, Tuple, Optional
+import numpy as np
 from django.db.models import QuerySet
 from django.conf import settings
-from bins.models import Node, SensorReading
-from .ai.model_store import load_model, load_forward_bundle
+from bins.models import Node, SensorReading, latest_readings_for, recent_readings_for
+from .ai.model_store import load_model, load_forward_bundle, scoring_models_version
+from .reading_cache import latest_readings_snapshot, priorities_snapshot
+from .geo import distance_to_point_m, node_arrays
 
 # Default features in case settings is missing them
 DEFAULT_DYNAMIC_FEATURES = {
@@ -19,16 +23,6 @@ DEFAULT_DYNAMIC_FEATURES = {
     'traffic_density': {'type': 'cost_multiplier', 'weight': 0.10, 'min_val': 0.0, 'max_val': 1.0, 'impact': 'negative'}
 }
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate haversine distance between two points in meters"""
-    R = 6371000.0  # Earth's radius in meters
-    phi1, phi2 = math.radians(lat1 or 0.0), math.radians(lat2 or 0.0)
-    dphi = math.radians((lat2 or 0.0) - (lat1 or 0.0))
-    dlambda = math.radians((lon2 or 0.0) - (lon1 or 0.0))
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
 class PriorityCalculator:
     """
     Calculates node priorities based on the specified rules:
@@ -37,6 +31,10 @@ class PriorityCalculator:
     - Higher gas level → higher priority
     - Higher temperature and humidity → slightly higher priority
     """
+
+    # SensorReading columns priority scoring reads (snapshot and recent history)
+    READING_FIELDS = ('node_id', 'timestamp', 'temperature', 'humidity',
+                      'gas_level', 'waste_level', 'traffic_density')
     
     def __init__(self, 
                  distance_weight: float = 0.25,
@@ -117,11 +115,50 @@ class PriorityCalculator:
             
         return max(0.0, min(1.0, final_priority))
     
+    def calculate_priorities_vectorized(self, **features) -> np.ndarray:
+        """
+        calculate_single_priority over arrays: each keyword is a length-N
+        sequence of one feature (None/NaN = missing for that row). Clamping and
+        weight renormalisation are array operations, so N rows cost one pass
+        per feature instead of N Python-level evaluations.
+        """
+        feature_config = getattr(settings, 'DYNAMIC_FEATURES', DEFAULT_DYNAMIC_FEATURES)
+        n = len(next(iter(features.values()))) if features else 0
+        score = np.zeros(n)
+        active_weight_sum = np.zeros(n)
+
+        for feature, config in feature_config.items():
+            weight = config.get('weight', 0.0)
+            if feature not in features or weight <= 0.0:
+                continue
+            vals = np.array(features[feature], dtype=float)
+            present = ~np.isnan(vals)
+
+            min_v = config.get('min_val', 0.0)
+            max_v = config.get('max_val', 1.0)
+            impact = config.get('impact', 'positive')
+            if impact == 'deviation' and 'optimal' in config:
+                opt = config['optimal']
+                max_dev = max(abs(max_v - opt), abs(min_v - opt))
+                norm = np.abs(vals - opt) / max_dev if max_dev > 0 else np.zeros(n)
+            else:
+                norm = (vals - min_v) / (max_v - min_v) if max_v > min_v else np.zeros(n)
+            norm = np.clip(norm, 0.0, 1.0)
+            if impact == 'negative':
+                norm = 1.0 - norm
+
+            score += np.where(present, norm * weight, 0.0)
+            active_weight_sum += present * weight
+
+        score = np.divide(score, active_weight_sum, out=np.zeros(n), where=active_weight_sum > 0)
+        return np.clip(score, 0.0, 1.0)
+
     def calculate_node_priorities(self, 
                                 nodes: List[Node],
                                 user_lat: float,
                                 user_lng: float,
-                                use_ai_model: bool = True) -> Dict[int, float]:
+                                use_ai_model: bool = True,
+                                max_candidates: Optional[int] = None) -> Dict[int, float]:
         """
         Calculate priorities for all nodes
         
@@ -130,6 +167,11 @@ class PriorityCalculator:
             user_lat: User latitude
             user_lng: User longitude
             use_ai_model: Whether to use trained AI model for prediction
+            max_candidates: When set, only the nearest this-many nodes within
+                max_distance_m go through the AI model. The rest get a capped
+                score: their rule-based score scaled into [0, lowest modelled
+                score], so they keep their relative order but never rank above
+                a modelled node. For callers that only need the top few nodes.
         
         Returns:
             Tuple of (priorities_dict, traffic_scores_dict)
@@ -146,163 +188,299 @@ class PriorityCalculator:
         forward_bundle = load_forward_bundle() if use_ai_model else None
         ai_model = load_model() if (use_ai_model and forward_bundle is None) else None
 
-        for node in nodes:
+        # Distance from user to every node in one vectorized call
+        arrays = node_arrays(nodes)
+        distances = distance_to_point_m(user_lat, user_lng, arrays.lats, arrays.lngs)
+        if forward_bundle is None and ai_model is None:
+            max_candidates = None  # everything is rule-scored; nothing to prune
+        model_nodes = self._model_candidates(nodes, distances, latest_readings, max_candidates)
+
+        # Recent history for every scored node in one windowed query, not one per node
+        history = {}
+        if forward_bundle is not None:
+            history = self._get_recent_history([n for n in nodes if n.id in model_nodes])
+        distances = distances.tolist()
+
+        ai_rows = []  # (node_id, reading, distance_m) predicted in one batch below
+        forward_items = []  # (node, recent readings) likewise
+        rule_rows = []  # (node_id, reading, distance_m) likewise
+        capped_rows = []  # non-candidates: (node_id, reading, distance_m), scored last
+        for node, distance_m in zip(nodes, distances):
             reading = latest_readings.get(node.id)
             if not reading:
                 priorities[node.id] = 0.0
                 continue
 
-            # Calculate distance from user
-            distance_m = haversine_distance(
-                user_lat, user_lng,
-                node.latitude or 0.0, node.longitude or 0.0
-            )
-
-            if forward_bundle is not None:
-                priority = self._predict_priority_forward(forward_bundle, node)
+            if node.id not in model_nodes:
+                # Outside the candidate set: cheap rule score, capped below the modelled nodes
+                capped_rows.append((node.id, reading, distance_m))
+                priority = 0.0
+            elif forward_bundle is not None:
+                forward_items.append((node, history.get(node.id, [])))
+                priority = 0.0
             elif ai_model:
-                # Use AI model for prediction
-                priority = self._predict_priority_with_ai(
-                    ai_model, node, reading, distance_m
-                )
+                # Placeholder keeps node order; filled from the batched predict
+                ai_rows.append((node.id, reading, distance_m))
+                priority = 0.0
             else:
-                # Use rule-based calculation with dynamic kwargs extraction
-                kwargs = {
-                    'distance_m': distance_m,
-                    'waste_level': reading.waste_level,
-                    'gas_level': reading.gas_level,
-                    'temperature': reading.temperature,
-                    'humidity': reading.humidity
-                }
-                if hasattr(reading, 'traffic_density') and reading.traffic_density is not None:
-                    kwargs['traffic_density'] = reading.traffic_density
-                
-                priority = self.calculate_single_priority(**kwargs)
+                # Rule-based, scored for all nodes at once below
+                rule_rows.append((node.id, reading, distance_m))
+                priority = 0.0
             
             priorities[node.id] = priority
             traffic_scores[node.id] = getattr(reading, 'traffic_density', 0.0)
+
+        if ai_rows:
+            predicted = self._predict_priorities_with_ai(
+                ai_model, [(reading, distance_m) for _, reading, distance_m in ai_rows]
+            )
+            for (node_id, _, _), priority in zip(ai_rows, predicted):
+                priorities[node_id] = priority
+        if rule_rows:
+            scored = self._rule_priorities([(reading, distance_m) for _, reading, distance_m in rule_rows])
+            for (node_id, _, _), priority in zip(rule_rows, scored):
+                priorities[node_id] = priority
+        if forward_items:
+            predicted = self._predict_priorities_forward(forward_bundle, forward_items)
+            for (node, _), priority in zip(forward_items, predicted):
+                priorities[node.id] = priority
+        if capped_rows:
+            modelled = [priorities[node_id] for node_id in model_nodes]
+            # Strictly below the lowest modelled score (rule scores are <= 1.0)
+            cap = float(np.nextafter(min(modelled), 0.0)) if modelled else 1.0
+            scored = self._rule_priorities([(reading, distance_m) for _, reading, distance_m in capped_rows])
+            for (node_id, _, _), priority in zip(capped_rows, scored):
+                priorities[node_id] = priority * cap
         
         return priorities, traffic_scores
     
+    def cached_node_priorities(self,
+                               nodes: List[Node],
+                               user_lat: float,
+                               user_lng: float,
+                               use_ai_model: bool = True,
+                               max_candidates: Optional[int] = None):
+        """
+        calculate_node_priorities shared across requests for a few seconds.
+
+        The result is keyed on the user location rounded to 3 decimals
+        (~100 m cells), the node ids/positions, the readings version and, for
+        AI scoring, the model files' version, so bursts of dashboard/route
+        requests from the same area reuse one computation. A miss computes at
+        the exact location; a hit may return scores computed for another
+        point in the same cell.
+
+        A retrained model or a reading committed through this process misses
+        right away; readings written by other workers are only seen once the
+        entry expires unless the cache backend is shared (see reading_cache).
+        """
+        arrays = node_arrays(nodes)
+        digest = hashlib.md5(
+            arrays.ids.tobytes() + arrays.lats.tobytes() + arrays.lngs.tobytes()
+        ).hexdigest()
+        models = scoring_models_version() if use_ai_model else '-'
+        key = (f'{round(user_lat, 3)}:{round(user_lng, 3)}:{models}:'
+               f'{max_candidates}:{digest}')
+        return priorities_snapshot(key, lambda: self.calculate_node_priorities(
+            nodes, user_lat, user_lng, use_ai_model=use_ai_model, max_candidates=max_candidates
+        ))
+
+    def calculate_with_top(self,
+                           nodes: List[Node],
+                           user_lat: float,
+                           user_lng: float,
+                           max_nodes: int = 5,
+                           use_ai_model: bool = True,
+                           max_candidates: Optional[int] = None):
+        """
+        Priorities for all nodes and the top `max_nodes` of them from one
+        scoring pass (via cached_node_priorities).
+
+        Returns:
+            (priorities_dict, traffic_scores_dict, [(Node, priority), ...] highest first)
+        """
+        priorities, traffic_scores = self.cached_node_priorities(
+            nodes, user_lat, user_lng, use_ai_model=use_ai_model, max_candidates=max_candidates
+        )
+        top = self.select_top_priority_nodes(
+            nodes, user_lat, user_lng, max_nodes=max_nodes, priorities=priorities
+        )
+        return priorities, traffic_scores, top
+
+    def _model_candidates(self, nodes: List[Node], distances: np.ndarray,
+                          latest_readings: Dict[int, SensorReading],
+                          max_candidates: Optional[int]) -> set:
+        """Ids of the nodes worth a model prediction (all nodes with a reading by default)"""
+        with_reading = [i for i, node in enumerate(nodes) if node.id in latest_readings]
+        if max_candidates is None:
+            return {nodes[i].id for i in with_reading}
+        in_range = [i for i in with_reading if distances[i] <= self.max_distance_m]
+        nearest = heapq.nsmallest(max_candidates, in_range, key=lambda i: distances[i])
+        return {nodes[i].id for i in nearest}
+
     def _get_latest_readings(self, nodes: List[Node]) -> Dict[int, SensorReading]:
-        """Get the latest sensor reading for each node"""
-        node_ids = [n.id for n in nodes]
-        readings = SensorReading.objects.filter(
-            node_id__in=node_ids
-        ).order_by('node_id', '-timestamp')
-        
-        latest_by_node = {}
-        for reading in readings:
-            if reading.node_id not in latest_by_node:
-                latest_by_node[reading.node_id] = reading
-        
-        return latest_by_node
+        """Get the latest sensor reading for each node (served from the shared snapshot cache)"""
+        snapshot = latest_readings_snapshot(self._load_latest_readings)
+        return {n.id: snapshot[n.id] for n in nodes if n.id in snapshot}
+
+    def _load_latest_readings(self) -> Dict[int, SensorReading]:
+        """Latest sensor reading for every node, straight from the database"""
+        # One row per node (ROW_NUMBER window) with only the fields priorities read
+        readings = latest_readings_for().only(*self.READING_FIELDS)
+        return {reading.node_id: reading for reading in readings}
     
-    def _predict_priority_with_ai(self, 
-                                model,
-                                node: Node,
-                                reading: SensorReading,
-                                distance_m: float) -> float:
+    def _get_recent_history(self, nodes: List[Node]) -> Dict[int, List[SensorReading]]:
+        """Last ROLL readings of each node, oldest first, from a single query"""
+        from .ai.train_forward import ROLL
+        history = {}
+        # Only the scored columns, streamed: up to ROLL rows per node are never
+        # held twice (queryset cache + history lists)
+        readings = recent_readings_for(nodes, per_node=ROLL).only(*self.READING_FIELDS)
+        for reading in readings.iterator(chunk_size=2000):
+            history.setdefault(reading.node_id, []).append(reading)
+        return {node_id: readings[::-1] for node_id, readings in history.items()}
+
+    def _rule_priorities(self, rows: List[Tuple[SensorReading, float]]) -> List[float]:
+        """Rule-based priorities for (reading, distance from user in meters) rows"""
+        return self.calculate_priorities_vectorized(
+            distance_m=[distance_m for _, distance_m in rows],
+            waste_level=[reading.waste_level for reading, _ in rows],
+            gas_level=[reading.gas_level for reading, _ in rows],
+            temperature=[reading.temperature for reading, _ in rows],
+            humidity=[reading.humidity for reading, _ in rows],
+            traffic_density=[getattr(reading, 'traffic_density', None) for reading, _ in rows],
+        ).tolist()
+
+    @staticmethod
+    def _ai_features(reading: SensorReading, distance_m: float) -> List[float]:
+        """Feature row matching the training data format"""
+        traffic = getattr(reading, 'traffic_density', 0.0)
+        return [
+            distance_m,                    # distance_from_user
+            reading.temperature,           # temperature
+            reading.humidity,              # humidity
+            reading.gas_level,             # gas_level
+            reading.waste_level,           # waste_level
+            traffic,                       # traffic_density
+            reading.temperature,           # mean_temperature (simplified)
+            0.0,                          # std_temperature (simplified)
+            reading.humidity,              # mean_humidity (simplified)
+            0.0,                          # std_humidity (simplified)
+            reading.gas_level,             # mean_gas (simplified)
+            0.0,                          # std_gas (simplified)
+            reading.waste_level,           # mean_waste (simplified)
+            0.0,                          # std_waste (simplified)
+            traffic,                       # mean_traffic (simplified)
+            0.0,                          # std_traffic (simplified)
+            reading.timestamp.hour,        # hour
+            reading.timestamp.weekday()    # day_of_week
+        ]
+
+    def _predict_priorities_with_ai(self,
+                                    model,
+                                    rows: List[Tuple[SensorReading, float]]) -> List[float]:
         """
-        Use trained Random Forest model to predict priority
+        Use trained Random Forest model to predict priorities for many nodes
+        with a single predict call
         
         Args:
             model: Trained sklearn model
-            node: Node object
-            reading: Latest sensor reading
-            distance_m: Distance from user in meters
+            rows: (latest sensor reading, distance from user in meters) per node
         
         Returns:
-            Predicted priority score (0.0-1.0)
+            Predicted priority scores (0.0-1.0), in the order of `rows`
         """
         try:
-            # Prepare features matching training data format
-            traffic = getattr(reading, 'traffic_density', 0.0)
-            features = [
-                distance_m,                    # distance_from_user
-                reading.temperature,           # temperature
-                reading.humidity,              # humidity
-                reading.gas_level,             # gas_level
-                reading.waste_level,           # waste_level
-                traffic,                       # traffic_density
-                reading.temperature,           # mean_temperature (simplified)
-                0.0,                          # std_temperature (simplified)
-                reading.humidity,              # mean_humidity (simplified)
-                0.0,                          # std_humidity (simplified)
-                reading.gas_level,             # mean_gas (simplified)
-                0.0,                          # std_gas (simplified)
-                reading.waste_level,           # mean_waste (simplified)
-                0.0,                          # std_waste (simplified)
-                traffic,                       # mean_traffic (simplified)
-                0.0,                          # std_traffic (simplified)
-                reading.timestamp.hour,        # hour
-                reading.timestamp.weekday()    # day_of_week
-            ]
-            
-            # Predict priority
-            prediction = model.predict([features])[0]
-            
+            X = np.array([self._ai_features(reading, distance_m) for reading, distance_m in rows],
+                         dtype=np.float32)
             # Ensure output is in valid range
-            return max(0.0, min(1.0, float(prediction)))
-            
+            return np.clip(model.predict(X), 0.0, 1.0).astype(float).tolist()
         except Exception as e:
             # Fallback to rule-based calculation if AI prediction fails
-            kwargs = {
-                'distance_m': distance_m,
-                'waste_level': reading.waste_level,
-                'gas_level': reading.gas_level,
-                'temperature': reading.temperature,
-                'humidity': reading.humidity
-            }
-            if hasattr(reading, 'traffic_density') and reading.traffic_density is not None:
-                kwargs['traffic_density'] = reading.traffic_density
-            return self.calculate_single_priority(**kwargs)
+            return self._rule_priorities(rows)
     
-    def _predict_priority_forward(self, bundle, node: Node) -> float:
+    def _predict_priority_forward(self, bundle, node: Node,
+                                  recent: Optional[List[SensorReading]] = None) -> float:
         """
         Risk-aware priority from the forward-looking bundle, using the node's
         recent reading history to build the engineered feature row.
+        `recent` (oldest first) is queried per node when not supplied.
         Falls back to the renormalised rule if anything is missing.
         """
-        try:
-            from .ai.train_forward import FEATURE_COLS, ROLL, predict_forward
-            import numpy as np
+        if recent is None:
+            from .ai.train_forward import ROLL
             recent = list(
                 SensorReading.objects.filter(node_id=node.id)
                 .order_by('-timestamp')[:ROLL]
             )[::-1]
-            if not recent:
-                raise ValueError("no readings")
-            latest = recent[-1]
-
-            def series(attr):
-                return [float(getattr(r, attr)) for r in recent]
-
-            row = {}
-            for src, name in [('waste_level', 'waste'), ('gas_level', 'gas'),
-                              ('temperature', 'temp'), ('humidity', 'humidity')]:
-                vals = series(src)
-                row[name] = vals[-1]
-                row[f'mean_{name}'] = float(np.mean(vals))
-                row[f'std_{name}'] = float(np.std(vals)) if len(vals) > 1 else 0.0
-                row[f'trend_{name}'] = (vals[-1] - vals[0]) / ROLL if len(vals) > 1 else 0.0
-            row['hour'] = latest.timestamp.hour
-            row['dow'] = latest.timestamp.weekday()
-            row = {c: row.get(c, 0.0) for c in FEATURE_COLS}
-            return predict_forward(bundle, row)['risk_priority']
-        except Exception:
+        return self._predict_priorities_forward(bundle, [(node, recent)])[0]
+
+    def _predict_priorities_forward(self, bundle,
+                                    items: List[Tuple[Node, List[SensorReading]]]) -> List[float]:
+        """
+        _predict_priority_forward for many (node, recent) pairs: feature rows
+        are built per node, then scored with one predict_forward_batch call.
+        """
+        from .ai.train_forward import predict_forward_batch
+        priorities = [None] * len(items)
+        rows, row_at = [], []
+        for i, (node, recent) in enumerate(items):
+            try:
+                rows.append(self._forward_feature_row(recent))
+                row_at.append(i)
+            except Exception:
+                priorities[i] = self._forward_fallback(node, recent)
+        if rows:
+            try:
+                outs = predict_forward_batch(bundle, rows)
+                for i, out in zip(row_at, outs):
+                    priorities[i] = out['risk_priority']
+            except Exception:
+                for i in row_at:
+                    priorities[i] = self._forward_fallback(*items[i])
+        return priorities
+
+    @staticmethod
+    def _forward_feature_row(recent: List[SensorReading]) -> Dict[str, float]:
+        """Engineered forward-model feature row from a node's recent readings"""
+        from .ai.train_forward import FEATURE_COLS, ROLL
+        if not recent:
+            raise ValueError("no readings")
+        latest = recent[-1]
+
+        def series(attr):
+            return [float(getattr(r, attr)) for r in recent]
+
+        row = {}
+        for src, name in [('waste_level', 'waste'), ('gas_level', 'gas'),
+                          ('temperature', 'temp'), ('humidity', 'humidity')]:
+            vals = series(src)
+            row[name] = vals[-1]
+            row[f'mean_{name}'] = float(np.mean(vals))
+            row[f'std_{name}'] = float(np.std(vals)) if len(vals) > 1 else 0.0
+            row[f'trend_{name}'] = (vals[-1] - vals[0]) / ROLL if len(vals) > 1 else 0.0
+        row['hour'] = latest.timestamp.hour
+        row['dow'] = latest.timestamp.weekday()
+        return {c: row.get(c, 0.0) for c in FEATURE_COLS}
+
+    def _forward_fallback(self, node: Node, recent: List[SensorReading]) -> float:
+        """Renormalised rule on the node's latest reading"""
+        if recent:
+            reading = recent[-1]
+        else:
             reading = SensorReading.objects.filter(node_id=node.id).order_by('-timestamp').first()
-            if not reading:
-                return 0.0
-            kwargs = {'waste_level': reading.waste_level, 'gas_level': reading.gas_level,
-                      'temperature': reading.temperature, 'humidity': reading.humidity}
-            return self.calculate_single_priority(**kwargs)
+        if not reading:
+            return 0.0
+        kwargs = {'waste_level': reading.waste_level, 'gas_level': reading.gas_level,
+                  'temperature': reading.temperature, 'humidity': reading.humidity}
+        return self.calculate_single_priority(**kwargs)
 
     def select_top_priority_nodes(self,
                                 nodes: List[Node],
                                 user_lat: float,
                                 user_lng: float,
-                                max_nodes: int = 5) -> List[Tuple[Node, float]]:
+                                max_nodes: int = 5,
+                                priorities: Optional[Dict[int, float]] = None) -> List[Tuple[Node, float]]:
         """
         Select top priority nodes based on distance and other factors
         
@@ -311,22 +489,24 @@ class PriorityCalculator:
             user_lat: User latitude
             user_lng: User longitude
             max_nodes: Maximum number of nodes to select (1-5)
+            priorities: Scores already returned by calculate_node_priorities
+                for these nodes, to avoid computing them twice per request
         
         Returns:
             List of (Node, priority_score) tuples sorted by priority (highest first)
         """
         # Calculate priorities for all nodes
-        priorities, _ = self.calculate_node_priorities(nodes, user_lat, user_lng)
+        if priorities is None:
+            priorities, _ = self.calculate_node_priorities(nodes, user_lat, user_lng)
         
-        # Sort nodes by priority (highest first)
-        node_priorities = [
+        node_priorities = (
             (node, priorities.get(node.id, 0.0)) 
             for node in nodes
-        ]
-        node_priorities.sort(key=lambda x: x[1], reverse=True)
+        )
         
-        # Return top N nodes
-        return node_priorities[:max_nodes]
+        # Top N nodes by priority (highest first): a size-N heap instead of a
+        # full sort; ties keep node order, exactly like a stable sort
+        return heapq.nlargest(max_nodes, node_priorities, key=lambda x: x[1])
 
 # Global instance for easy access
 priority_calculator = PriorityCalculator()
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Short-lived cache of the "latest reading per node" snapshot used by priority
+calculation, and of the priority results computed from it. Entries are keyed
+on a version counter that every reading write bumps, so route/dashboard
+requests share one aggregation until new telemetry arrives (or the TTL lapses
+for writes that bypass the model layer).
+
+The counter and entries live in Django's default cache. With the shipped
+LocMemCache that is per process: a write only invalidates the snapshot in the
+worker that handled it, and other workers keep serving their copy for up to
+SNAPSHOT_TTL_S / PRIORITIES_TTL_S. Deployments with more than one worker need
+a shared backend (Redis/Memcached) for invalidation to reach every worker.
+"""
+import time
+from django.core.cache import cache
+
+VERSION_KEY = 'bins:latest_readings:version'
+SNAPSHOT_TTL_S = 30
+PRIORITIES_TTL_S = 15
+
+
+def readings_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never revives old snapshot keys
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_readings_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        readings_version()
+
+
+def latest_readings_snapshot(loader):
+    """Return the cached {node_id: SensorReading} snapshot, calling `loader` on a miss."""
+    return cache.get_or_set(f'bins:latest_readings:{readings_version()}', loader, SNAPSHOT_TTL_S)
+
+
+def priorities_snapshot(key, loader):
+    """Return cached priority results for `key` under the current readings version, calling `loader` on a miss."""
+    return cache.get_or_set(f'bins:priorities:{readings_version()}:{key}', loader, PRIORITIES_TTL_S)
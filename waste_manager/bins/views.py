@@ -1,35 +1,38 @@
 import json
-import math
+import numpy as np
+import orjson
 from datetime import datetime
+from functools import wraps
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.models import User
-from django.db import transaction
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import (
+    HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect
+from django.utils import timezone
 from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.cache import never_cache
 from django.middleware.csrf import get_token
+from . import fastjson
+from .fastjson import OrjsonResponse
 from .forms import SignupForm, ProfileForm, SettingsForm, LocationForm
-from .models import Node, SensorReading, AICost, CollectionRoute, Notification, UserSetting, BinGroup
-from .serializers import serialize_reading, serialize_node
+from .models import Node, SensorReading, AICost, CollectionRoute, Notification, UserSetting, BinGroup, latest_readings_for
+from .serializers import (
+    serialize_reading, serialize_reading_row, serialize_node,
+    last_reading_ts_by_node, READING_VALUE_FIELDS,
+)
 from .utils.dijkstra import compute_route, compute_optimal_route
+from .utils.geo import node_arrays, node_distance_matrix
 from .utils.ai.model_store import load_model, get_model_version
 from .utils.ai import train_model as trainer
 from .utils.priority_calculator import priority_calculator
 
-def _haversine_m(lat1, lon1, lat2, lon2):
-    # Haversine distance in meters
-    R = 6371000.0
-    phi1, phi2 = math.radians(lat1 or 0.0), math.radians(lat2 or 0.0)
-    dphi = math.radians((lat2 or 0.0) - (lat1 or 0.0))
-    dlambda = math.radians((lon2 or 0.0) - (lon1 or 0.0))
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
 def _compute_priority(distance_m, waste_level, gas_level, temperature, humidity,
                       dist_weight=0.2, waste_weight=0.4, gas_weight=0.3, temp_hum_weight=0.1,
                       dist_cap_m=2000.0):
@@ -65,17 +68,20 @@ def _build_graph(nodes, priorities_by_node, alpha):
         w(u->v) = base_distance_m / (1 + alpha * (priority[v] * 10))
     This inversely scales cost by destination priority as requested.
     """
-    ids = [n.id for n in nodes]
-    graph = {nid: [] for nid in ids}
-    for i, u in enumerate(nodes):
-        for j, v in enumerate(nodes):
-            if i == j:
-                continue
-            base = _haversine_m(u.latitude or 0.0, u.longitude or 0.0, v.latitude or 0.0, v.longitude or 0.0)
-            pv = float(priorities_by_node.get(v.id, 0.0))
-            w = base / (1.0 + alpha * (pv * 10.0))
-            graph[u.id].append((v.id, w))
-    return graph
+    arrays = node_arrays(nodes)
+    ids = arrays.ids.tolist()
+    n = len(ids)
+    if not n:
+        return {}
+    base = node_distance_matrix(arrays)
+    # One lookup per node, aligned with `ids`; the n x n kernel only indexes by position
+    pv = np.fromiter((priorities_by_node.get(nid, 0.0) for nid in ids), dtype=np.float32, count=n)
+    weights = base / (1.0 + alpha * (pv * 10.0))[None, :]
+    # Drop self-loops with one mask, then convert each row once
+    off_diag = ~np.eye(n, dtype=bool)
+    neighbours = np.broadcast_to(arrays.ids, (n, n))[off_diag].reshape(n, n - 1).tolist()
+    rows = weights[off_diag].reshape(n, n - 1).tolist()
+    return {u: list(zip(vs, ws)) for u, vs, ws in zip(ids, neighbours, rows)}
 
 def signup_view(request):
     if request.method == 'POST':
@@ -120,13 +126,15 @@ def dashboard_view(request):
     # Ensure user has settings - only for authenticated users
     user_settings, _ = UserSetting.objects.get_or_create(user=request.user)
     
-    # Get latest reading per node with last update timestamps
-    latest_per_node = {}
-    for r in SensorReading.objects.select_related('node').order_by('node_id', '-timestamp'):
-        if r.node_id not in latest_per_node:
-            latest_per_node[r.node_id] = r
-    
-    latest_readings = list(latest_per_node.values())
+    # Latest reading per node with last update timestamps: one row per node
+    # from the ROW_NUMBER window, not every reading deduplicated in Python,
+    # and only the columns the readings table renders
+    latest_readings = list(
+        latest_readings_for().select_related('node').only(
+            'node', 'timestamp', 'temperature', 'humidity', 'gas_level', 'waste_level',
+            'node__name', 'node__last_update',
+        )
+    )
     
     # Prepare nodes for UI selections
     nodes_for_select = Node.objects.all().order_by('name')
@@ -159,25 +167,18 @@ def dashboard_view(request):
             user_lat = float(user_lat)
             user_lng = float(user_lng)
             
-            # Get all nodes
-            nodes = Node.objects.all()
+            # Get all nodes (only the columns scoring reads)
+            nodes = list(Node.objects.only(*Node.ROUTING_FIELDS))
             
-            # Calculate priorities
-            priorities = priority_calculator.calculate_node_priorities(
-                nodes=list(nodes),
+            # Priorities and the top priority nodes (1-5) from one scoring pass
+            priorities, _, top_nodes = priority_calculator.calculate_with_top(
+                nodes=nodes,
                 user_lat=user_lat,
                 user_lng=user_lng,
+                max_nodes=5,
                 use_ai_model=True
             )
             
-            # Get top priority nodes (1-5)
-            top_nodes = priority_calculator.select_top_priority_nodes(
-                nodes=list(nodes),
-                user_lat=user_lat,
-                user_lng=user_lng,
-                max_nodes=5
-            )
-            
             priority_info = {
                 'user_location': {'lat': user_lat, 'lng': user_lng},
                 'priorities': priorities,
@@ -192,7 +193,6 @@ def dashboard_view(request):
         'latest_readings': latest_readings,
         'latest_route': latest_route.route_data if latest_route else None,
         'notif_count': notif_count,
-        'now': datetime.now(),
         'model_version': model_version,
         'priority_info': priority_info,
         'user_settings': user_settings,
@@ -224,43 +224,103 @@ def settings_view(request):
         form = SettingsForm(instance=settings_obj)
     return render(request, 'bins/bins/settings.html', {'form': form})
 
-@require_GET
-@login_required
-def api_latest_readings(request):
+def _async_api_view(method):
+    """
+    require_http_methods + login_required for async views (the Django 4.2
+    decorators only wrap sync views). The user is resolved on the request
+    thread before the view body runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != method:
+                return HttpResponseNotAllowed([method])
+            is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+            if not is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def _db_call(fn, *args, **kwargs):
+    """
+    Run an ORM call from an async view on the request's sync thread
+    (thread_sensitive), so it reuses that thread's persistent connection
+    instead of opening one per throwaway executor thread.
+    """
+    return sync_to_async(fn, thread_sensitive=True)(*args, **kwargs)
+
+# Rows per response chunk for streamed list endpoints
+STREAM_CHUNK_SIZE = 500
+
+@_async_api_view('GET')
+async def api_latest_readings(request):
     N = int(request.GET.get('limit', 10))
-    readings = (SensorReading.objects
-                .select_related('node')
-                .order_by('-timestamp')[:N])
-    data = [serialize_reading(r) for r in readings]
-    return JsonResponse({'readings': data})
 
+    def load():
+        # Last-update times only for the nodes on this page, so the GROUP BY
+        # never scans every node's readings
+        rows = list(SensorReading.objects
+                    .order_by('-timestamp')
+                    .values(*READING_VALUE_FIELDS)[:N])
+        return rows, last_reading_ts_by_node({row['node_id'] for row in rows})
+
+    rows, last_ts = await _db_call(load)
+
+    def stream():
+        # Encode and send the page chunk by chunk rather than as one payload
+        yield b'{"readings":['
+        for start in range(0, len(rows), STREAM_CHUNK_SIZE):
+            chunk = rows[start:start + STREAM_CHUNK_SIZE]
+            yield (b',' if start else b'') + b','.join(
+                fastjson.dumps(serialize_reading_row(row, last_ts)) for row in chunk)
+        yield b']}'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+def _reading_from_payload(payload):
+    """Unsaved SensorReading built from one submitted JSON object."""
+    # Handle waste_level properly - ensure it's not None if provided
+    waste_level = payload.get('waste_level')
+    if waste_level is not None:
+        waste_level = float(waste_level)
+    else:
+        waste_level = 0.0  # Default value instead of None
+
+    return SensorReading(
+        node_id=int(payload['node_id']),
+        temperature=float(payload.get('temperature', 0.0)),
+        humidity=float(payload.get('humidity', 0.0)),
+        gas_level=float(payload.get('gas_level', 0.0)),
+        waste_level=waste_level,
+        traffic_density=float(payload.get('traffic_density', 0.0)),
+        distance_to_next_bin=payload.get('distance_to_next_bin'),
+    )
 
 @csrf_exempt
 @require_POST
 #@login_required
 def api_submit_reading(request):
+    """Accepts one reading object, or a JSON array of them for batched ingestion."""
     try:
-        payload = json.loads(request.body.decode('utf-8'))
-        node_id = payload['node_id']
-        node = Node.objects.get(id=node_id)
+        payload = orjson.loads(request.body)
 
-        # Handle waste_level properly - ensure it's not None if provided
-        waste_level = payload.get('waste_level')
-        if waste_level is not None:
-            waste_level = float(waste_level)
-        else:
-            waste_level = 0.0  # Default value instead of None
+        if isinstance(payload, list):
+            readings = [_reading_from_payload(item) for item in payload]
+            node_ids = {r.node_id for r in readings}
+            known = set(Node.objects.filter(id__in=node_ids).values_list('id', flat=True))
+            missing = sorted(node_ids - known)
+            if missing:
+                raise Node.DoesNotExist(f'Unknown node_id(s): {missing}')
+            created = SensorReading.bulk_ingest(readings)
+            return OrjsonResponse({'status': 'ok', 'created': len(created)}, status=201)
 
-        r = SensorReading.objects.create(
-            node=node,
-            temperature=float(payload.get('temperature', 0.0)),
-            humidity=float(payload.get('humidity', 0.0)),
-            gas_level=float(payload.get('gas_level', 0.0)),
-            waste_level=waste_level,
-            traffic_density=float(payload.get('traffic_density', 0.0)),
-            distance_to_next_bin=payload.get('distance_to_next_bin'),
-        )
-        return JsonResponse({'status': 'ok', 'reading': serialize_reading(r)}, status=201)
+        node = Node.objects.get(id=payload['node_id'])
+        r = _reading_from_payload(payload)
+        r.node = node
+        r.save()
+        return OrjsonResponse({'status': 'ok', 'reading': serialize_reading(r)}, status=201)
     except Exception as e:
         return HttpResponseBadRequest(json.dumps({'error': str(e)}), content_type='application/json')
 
@@ -270,8 +330,9 @@ def api_train_model(request):
     # Basic protection: staff-only
     if not request.user.is_staff:
         return HttpResponseForbidden(json.dumps({'error': 'Forbidden'}), content_type='application/json')
-    result = trainer.train_from_db()
-    return JsonResponse({'status': 'trained', **result})
+    # Retraining is skipped when no readings changed since the saved model; ?force=1 overrides
+    result = trainer.train_from_db(force=request.GET.get('force') in ('1', 'true'))
+    return OrjsonResponse({'status': 'trained', **result})
 
 @require_POST
 @login_required
@@ -281,7 +342,7 @@ def api_predict_cost(request):
     if model is None:
         return HttpResponseBadRequest(json.dumps({'error': 'Model not found. Train first.'}), content_type='application/json')
     try:
-        payload = json.loads(request.body.decode('utf-8')) if request.body else {}
+        payload = orjson.loads(request.body) if request.body else {}
         per_node = payload.get('per_node')  # [{node_id, features: {...}}]
         meta_version = get_model_version()
         outputs = []
@@ -290,27 +351,28 @@ def api_predict_cost(request):
             # For simplicity, assume server knows feature order from meta
             from .utils.ai.model_store import meta_path
         else:
-            # Build features from latest readings like training code
+            # Build features from latest readings like training code, in the
+            # column order the model was trained on
             df = trainer._extract_features_df()
-            feature_cols = [c for c in df.columns if c not in ('node_id',)]
-            X = df[[c for c in feature_cols if c != 'node_id']].values
-            preds = model.predict(X)
-            for idx, row in df.iterrows():
-                node_id = int(row['node_id'])
-                pred = float(preds[idx])
-                AICost.objects.create(
-                    node=Node.objects.get(id=node_id),
-                    features={k: float(row[k]) for k in feature_cols if k != 'node_id'},
-                    predicted_cost=pred,
-                    model_version=meta_version,
-                )
-                outputs.append({
-                    'node_id': node_id,
-                    'predicted_cost': pred,
-                    'model_version': meta_version,
-                    'timestamp': datetime.utcnow().isoformat() + 'Z',
-                })
-        return JsonResponse({'predictions': outputs})
+            feature_cols = list(trainer.FEATURE_COLS)
+            X = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32))
+            preds = model.predict(X).tolist()
+            node_ids = df['node_id'].astype(int).tolist()
+            features = df[feature_cols].astype(float).to_dict('records')
+            # node_id comes from the readings' FK, so no Node fetch is needed,
+            # and all rows go in with one batched INSERT
+            AICost.objects.bulk_create([
+                AICost(node_id=node_id, features=feats, predicted_cost=pred, model_version=meta_version)
+                for node_id, feats, pred in zip(node_ids, features, preds)
+            ], batch_size=500)
+            ts = datetime.utcnow().isoformat() + 'Z'
+            outputs = [{
+                'node_id': node_id,
+                'predicted_cost': pred,
+                'model_version': meta_version,
+                'timestamp': ts,
+            } for node_id, pred in zip(node_ids, preds)]
+        return OrjsonResponse({'predictions': outputs})
     except Exception as e:
         return HttpResponseBadRequest(json.dumps({'error': str(e)}), content_type='application/json')
 
@@ -321,7 +383,7 @@ def api_compute_route(request):
     Enhanced route computation API using new priority-based Dijkstra implementation
     """
     try:
-        payload = json.loads(request.body.decode('utf-8')) if request.body else {}
+        payload = orjson.loads(request.body) if request.body else {}
         
         # Extract parameters
         group_name = payload.get('group')  # optional: route only within a group
@@ -335,7 +397,7 @@ def api_compute_route(request):
         top_n = int(payload.get('top_n', 5))  # Default to 5 nodes as specified
         
         # Get nodes
-        nodes_qs = Node.objects.all().order_by('id')
+        nodes_qs = Node.objects.only(*Node.ROUTING_FIELDS).order_by('id')
         if group_name:
             nodes_qs = nodes_qs.filter(group__name=group_name)
         nodes = list(nodes_qs)
@@ -362,22 +424,19 @@ def api_compute_route(request):
                 content_type='application/json'
             )
         
-        # Calculate priorities using the new system
-        priorities, traffic_scores = priority_calculator.calculate_node_priorities(
+        # Calculate priorities using the new system, with the top N picked from
+        # the same pass; with a top-N cut only the nearest candidates need the AI model
+        priorities, traffic_scores, top_priority_nodes = priority_calculator.calculate_with_top(
             nodes=nodes,
             user_lat=user_lat,
             user_lng=user_lng,
-            use_ai_model=True
+            max_nodes=max(top_n, 0),
+            use_ai_model=True,
+            max_candidates=3 * top_n if top_n > 0 else None
         )
         
         # Select top N priority nodes if specified
         if top_n > 0:
-            top_priority_nodes = priority_calculator.select_top_priority_nodes(
-                nodes=nodes,
-                user_lat=user_lat,
-                user_lng=user_lng,
-                max_nodes=top_n
-            )
             # Use only the top priority nodes for routing
             nodes = [node for node, _ in top_priority_nodes]
             # Update priorities dict to only include selected nodes
@@ -399,17 +458,13 @@ def api_compute_route(request):
         # Build edges information for visualization
         edges = []
         path = result.get('path', [])
-        graph_edges = result.get('graph_edges', {})
+        weights = result['weight_matrix']
+        index_of = {nid: i for i, nid in enumerate(result['node_ids'])}
         
         for i in range(len(path) - 1):
             u, v = path[i], path[i + 1]
-            # Find weight from graph
-            weight = 0.0
-            for neighbor_id, w in graph_edges.get(u, []):
-                if neighbor_id == v:
-                    weight = w
-                    break
-            edges.append({'u': u, 'v': v, 'w': weight})
+            # Read the weight straight from the route's weight matrix
+            edges.append({'u': u, 'v': v, 'w': float(weights[index_of[u], index_of[v]])})
         
         # Prepare route data
         route_json = {
@@ -430,7 +485,7 @@ def api_compute_route(request):
             generated_by=request.user
         )
         
-        return JsonResponse({
+        return OrjsonResponse({
             'route': route_json, 
             'total_cost': cr.total_cost, 
             'id': cr.id,
@@ -444,20 +499,20 @@ def api_compute_route(request):
             content_type='application/json'
         )
 
-@require_GET
-@login_required
-def api_notifications(request):
-    notifs = Notification.objects.filter(user__in=[None, request.user]).order_by('-created_at')[:20]
-    data = [{
-        'id': n.id, 'message': n.message, 'level': n.level,
-        'is_read': n.is_read, 'created_at': n.created_at.isoformat()
-    } for n in notifs]
-    return JsonResponse({'notifications': data})
+@_async_api_view('GET')
+async def api_notifications(request):
+    # Plain value rows carry exactly the serialized fields; no model instances
+    notifs = await _db_call(lambda: list(
+        Notification.objects.filter(user__in=[None, request.user]).order_by('-created_at')
+        .values('id', 'message', 'level', 'is_read', 'created_at')[:20]
+    ))
+    data = [{**n, 'created_at': n['created_at'].isoformat()} for n in notifs]
+    return OrjsonResponse({'notifications': data})
 
 @require_GET
 @login_required
 def api_model_info(request):
-    return JsonResponse({'model_version': get_model_version()})
+    return OrjsonResponse({'model_version': get_model_version()})
 
 @require_POST
 @login_required
@@ -466,7 +521,7 @@ def api_update_location(request):
     API endpoint to update user's location
     """
     try:
-        payload = json.loads(request.body.decode('utf-8'))
+        payload = orjson.loads(request.body)
         latitude = payload.get('latitude')
         longitude = payload.get('longitude')
         location_name = payload.get('location_name', '')
@@ -500,14 +555,13 @@ def api_update_location(request):
                 content_type='application/json'
             )
         
-        # Update user settings
-        user_settings, created = UserSetting.objects.get_or_create(user=request.user)
-        user_settings.latitude = latitude
-        user_settings.longitude = longitude
-        user_settings.location_name = location_name
-        user_settings.save()
+        # Update user settings: a single UPDATE of just these columns when the
+        # row exists (updated_at set by hand, .update() skips auto_now)
+        location = {'latitude': latitude, 'longitude': longitude, 'location_name': location_name}
+        if not UserSetting.objects.filter(user=request.user).update(updated_at=timezone.now(), **location):
+            UserSetting.objects.update_or_create(user=request.user, defaults=location)
         
-        return JsonResponse({
+        return OrjsonResponse({
             'success': True,
             'message': 'Location updated successfully',
             'location': {
@@ -532,23 +586,25 @@ def api_get_user_location(request):
     try:
         user_settings = UserSetting.objects.get(user=request.user)
         if user_settings.has_location():
-            return JsonResponse({
+            return OrjsonResponse({
                 'success': True,
                 'location': user_settings.get_location_dict()
             })
         else:
-            return JsonResponse({
+            return OrjsonResponse({
                 'success': False,
                 'message': 'No location set'
             })
     except UserSetting.DoesNotExist:
-        return JsonResponse({
+        return OrjsonResponse({
             'success': False,
             'message': 'User settings not found'
         })
 
 @require_GET
+@never_cache
 @ensure_csrf_cookie
 def api_csrf(request):
-    # Returns a CSRF token and sets csrftoken cookie
-    return JsonResponse({'csrfToken': get_token(request)})
\ No newline at end of file
+    # Returns a CSRF token and sets csrftoken cookie. Never touches
+    # request.session/request.user, so no session row is read or written
+    return OrjsonResponse({'csrfToken': get_token(request)})
\ No newline at end of file
@@ -1,3 +1,8 @@
-import pymysql
+# Prefer the mysqlclient C driver when it is installed; fall back to the
+# pure-Python pymysql shim so no build tools are required.
+try:
+    import MySQLdb  # noqa: F401
+except ImportError:
+    import pymysql
 
-pymysql.install_as_MySQLdb()
\ No newline at end of file
+    pymysql.install_as_MySQLdb()
@@ -39,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it compresses the final body (large JSON route/reading payloads)
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -84,6 +86,21 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Persistent connections: reuse each worker's MySQL connection for up to
+        # 60s instead of paying TCP + auth setup on every request. Health checks
+        # drop connections the server has closed before they are reused.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Per-process cache for the latest-readings snapshot (bins/utils/reading_cache.py).
+# With several workers, point this at a shared backend such as Redis
+# (django.core.cache.backends.redis.RedisCache) so the snapshot is shared.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'waste-manager',
     }
 }
 
@@ -142,6 +159,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'bins.fastjson.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Routing and AI defaults
@@ -161,6 +182,9 @@ FORWARD_MODEL_META_FILENAME = MODEL_STORE_DIR / 'forward_bundle_meta.json'
 ROUTING_REFINE = True
 ROUTING_AGING_GAMMA = 0.5      # anti-starvation weight (0 disables)
 ROUTING_AGING_TAU_H = 48.0     # hours at which the aging boost saturates
+# City-scale distance matrices use the equirectangular projection (<0.5% error
+# under ~20 km, no per-pair trig); wider point sets always fall back to haversine.
+ROUTING_EQUIRECT_DISTANCE = True
 
 # Local settings override
 try:
@@ -12,3 +12,6 @@ DATABASES = {
         'NAME': ':memory:',
     }
 }
+
+# PBKDF2 is deliberately slow; the suite creates users in many tests
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']